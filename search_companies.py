@@ -1,41 +1,161 @@
 import asyncio
 import json
-from browser_use import Agent, Controller
-from langchain_openai import ChatOpenAI
-import pandas as pd
+from contextvars import ContextVar
+from pathlib import Path
+from browser_use import ActionResult, Agent, Controller
 import logging
-from typing import Dict, Any, List
+from typing import Awaitable, Callable, Dict, Any, Optional
 from dotenv import load_dotenv
 from concurrent.futures import ThreadPoolExecutor
 from functools import partial
 
+from src.browser_resources import bind_resource_policy, prepare_controller
+from src.company_index import CompanyIndex
+from src.config import ResourcePolicy
+from src.controller_pool import ControllerPool
+from src.llm_cache import LLMCache
+from src.models import close_model_clients, get_chat_model
+from src.usage import USAGE_COLUMNS, Usage, agent_usage, track_usage
+from src.writers import open_writer
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+RESULT_COLUMNS = [
+    "name", "website", "has_offices", "brazil_office", "argentina_office", "all_locations", "brief"
+] + USAGE_COLUMNS
+
+# Сколько найденных компаний может ждать анализа; когда очередь полна, поиск притормаживает
+ANALYSIS_QUEUE_SIZE = 20
+
+# Куда действие save_company отдает компании текущего поиска; у агентов анализа не задано
+_discovery_sink: ContextVar[Optional[Callable[[Dict], Awaitable[None]]]] = ContextVar("discovery_sink", default=None)
+
 class CompanySearcher:
     def __init__(self, config_path: str = "config.json", max_parallel: int = 3):
         with open(config_path, 'r', encoding='utf-8') as f:
             self.config = json.load(f)
         
         self.max_parallel = max_parallel
-        self.companies_data = []
-        self.semaphore = asyncio.Semaphore(max_parallel)
+        # Результаты дописываются в файл по мере анализа; csv и jsonl видны сразу, xlsx - в конце
+        self.output_file = Path(self.config.get("companies_output_file", "companies_data.csv"))
+        self.saved = 0
         
-        # Создаем пул контроллеров
-        self.controllers = [
-            Controller(headless=True) for _ in range(max_parallel)
-        ]
+        # Блокировка картинок, шрифтов и трекеров; "resource_policy": null отключает ее
+        policy = self.config.get("resource_policy", {})
+        self.resource_policy = ResourcePolicy(**policy) if policy is not None else None
         
-        self.llm = ChatOpenAI(
-            model="gpt-4o-mini",
-            base_url="https://api.openai.com/v1"
-        )
+        # Пул контроллеров: задача берет свободный браузер и возвращает его после работы
+        self.pool = ControllerPool(self._new_controller, max_parallel)
+        # Поиск, ждущий места в очереди анализа, держит контроллер, поэтому
+        # одновременно ищем на один браузер меньше пула
+        self.search_slots = asyncio.Semaphore(max(1, max_parallel - 1))
+        
+        # Модель берется из общего реестра клиентов, ключ API - из окружения
+        self.model_name = self.config.get("model", "gpt-4o-mini")
+        self.temperature = self.config.get("temperature", 0.0)
+        # Клиент сам проходит через лимитер модели: троттлится и повторяется каждый вызов агента
+        self.llm = get_chat_model(self.model_name, self.temperature, limited=True)
+        
+        # Кэш результатов анализа для повторных запусков
+        self.cache = None
+        if self.config.get("use_cache", True) and LLMCache.enabled_for(self.temperature):
+            self.cache = LLMCache()
+        
+        # Уже проанализированные компании по домену: повторный поиск платит только за новые
+        self.index = None
+        if self.config.get("use_company_index", True):
+            freshness_days = self.config.get("company_index_freshness_days", 30)
+            self.index = CompanyIndex(freshness_seconds=int(freshness_days * 24 * 3600))
+        
+        # Расход токенов за запуск; по достижении max_cost_usd новые агенты не запускаются
+        self.usage = Usage()
+        self.max_cost = self.config.get("max_cost_usd")
+
+    def _budget_reached(self) -> bool:
+        if self.max_cost and self.usage.cost >= self.max_cost:
+            logger.warning(f"Cost budget ${self.max_cost:.2f} reached (${self.usage.cost:.4f} spent), skipping")
+            return True
+        return False
+
+    def _spend(self, usage: Usage) -> Usage:
+        self.usage = self.usage + usage
+        return usage
+
+    def _new_controller(self) -> Controller:
+        controller = Controller(headless=True)
+        prepare_controller(controller, self.resource_policy)
+        self._register_discovery(controller)
+        return controller
 
-    async def analyze_company(self, company: Dict, controller_idx: int) -> Dict[str, Any]:
+    @staticmethod
+    def _register_discovery(controller: Controller):
+        """Действие, которым агент поиска отдает компании по одной, не дожидаясь конца поиска"""
+        if not hasattr(controller, "action"):
+            return
+
+        @controller.action("Save one company from the list you are collecting: its name and official website")
+        async def save_company(name: str, website: str):
+            sink = _discovery_sink.get()
+            if sink is None:
+                return ActionResult(extracted_content="No company list is being collected now")
+            await sink({"name": name, "website": website})
+            return ActionResult(extracted_content=f"Saved {name}")
+
+    def _agent(self, task: str, controller: Controller) -> Agent:
+        agent = Agent(task=task, llm=self.llm, controller=controller)
+        bind_resource_policy(agent, controller, self.resource_policy)
+        return agent
+
+    async def analyze_company(self, company: Dict) -> Dict[str, Any]:
         """Анализирует одну компанию"""
-        async with self.semaphore:
-            analysis_agent = Agent(
-                task=f"""
+        task = self._analysis_task(company)
+        cache_model = f"browser:{self.model_name}"
+        if self.cache:
+            cached = self.cache.get(cache_model, self.temperature, task)
+            if cached is not None:
+                return {**self._company_record(company, json.loads(cached)), **Usage().columns()}
+        
+        async with self.pool.checkout() as controller:
+            if self._budget_reached():
+                return None
+            
+            with track_usage() as tracker:
+                try:
+                    company_data, _ = await self._agent(task, controller).run()
+                except Exception as e:
+                    logger.error(f"Error analyzing {company['website']}: {str(e)}")
+                    self._spend(agent_usage(tracker, self.model_name, task))
+                    return None
+                usage = self._spend(agent_usage(tracker, self.model_name, task, company_data))
+            
+            if isinstance(company_data, dict) and company_data.get('error') == 'access_blocked':
+                logger.warning(f"Access blocked for {company['website']}, skipping...")
+                return None
+            
+            if self.cache:
+                self.cache.set(
+                    cache_model, self.temperature, task,
+                    json.dumps(company_data, ensure_ascii=False)
+                )
+            return {**self._company_record(company, company_data), **usage.columns()}
+
+    def _company_record(self, company: Dict, company_data: Dict) -> Dict[str, Any]:
+        """Собирает строку результата из ответа агента"""
+        return {
+            "name": company['name'],
+            "website": company['website'],
+            "has_offices": company_data.get('has_offices', False),
+            "brazil_office": company_data.get('brazil_office', False),
+            "argentina_office": company_data.get('argentina_office', False),
+            "all_locations": ", ".join(company_data.get('all_locations', [])),
+            "brief": company_data.get('brief', "Analysis failed")
+        }
+
+    @staticmethod
+    def _analysis_task(company: Dict) -> str:
+        """Задача агента для анализа сайта компании"""
+        return f"""
                 Follow these steps exactly:
                 1. Type '{company['website']}' in the browser and press Enter
                 2. Wait for the page to load
@@ -56,38 +176,13 @@ class CompanySearcher:
                    - brief (string, max 500 chars)
                 7. If blocked or error occurs, return:
                    {{"error": "access_blocked"}}
-                """,
-                llm=self.llm,
-                controller=self.controllers[controller_idx]
-            )
-            
-            try:
-                company_data, _ = await analysis_agent.run()
-                
-                if isinstance(company_data, dict) and company_data.get('error') == 'access_blocked':
-                    logger.warning(f"Access blocked for {company['website']}, skipping...")
-                    return None
-                
-                return {
-                    "name": company['name'],
-                    "website": company['website'],
-                    "has_offices": company_data.get('has_offices', False),
-                    "brazil_office": company_data.get('brazil_office', False),
-                    "argentina_office": company_data.get('argentina_office', False),
-                    "all_locations": ", ".join(company_data.get('all_locations', [])),
-                    "brief": company_data.get('brief', "Analysis failed")
-                }
-            except Exception as e:
-                logger.error(f"Error analyzing {company['website']}: {str(e)}")
-                return None
+                """
 
-    async def search_and_analyze_companies(self, search_query: str) -> List[Dict[str, Any]]:
-        """Ищет и анализирует компании для заданного региона"""
+    async def search(self, search_query: str, emit: Callable[[Dict], Awaitable[None]]):
+        """Ищет компании для региона и отдает каждую в emit, как только агент ее нашел"""
         logger.info(f"Starting search for: {search_query}")
         
-        # Используем первый контроллер для поиска
-        search_agent = Agent(
-            task=f"""
+        search_task = f"""
             Follow these steps exactly:
             1. Type 'https://www.google.com' in the browser and press Enter
             2. Wait for the page to load
@@ -104,64 +199,114 @@ class CompanySearcher:
             7. For each company collect:
                - Company name
                - Official website URL (not social media profiles)
+               - Call save_company for the company as soon as you have both, then continue
             8. Return the data as a JSON list with fields: name, website
             9. If no data was extracted, return to step 3 and try different search terms like:
                - "{search_query} business directory"
                - "{search_query} company registry"
                - "list of {search_query}"
-            """,
-            llm=self.llm,
-            controller=self.controllers[0]
-        )
+            """
+        
+        # Компания может прийти и через save_company, и в итоговом ответе агента
+        seen = set()
+        
+        async def discovered(company: Dict):
+            website = str(company.get('website') or '').strip()
+            if not website or website in seen:
+                return
+            seen.add(website)
+            await emit({"name": company.get('name', ''), "website": website})
         
         try:
-            companies_data, _ = await search_agent.run()
-            logger.info(f"Found companies: {companies_data}")
-            
-            if not companies_data:
-                return []
-            
-            # Распределяем компании по контроллерам
-            tasks = []
-            for i, company in enumerate(companies_data):
-                if 'website' not in company or not company['website']:
-                    continue
-                controller_idx = i % self.max_parallel
-                tasks.append(self.analyze_company(company, controller_idx))
+            # Поиск тоже занимает контроллер из общего пула
+            async with self.search_slots, self.pool.checkout() as controller:
+                if self._budget_reached():
+                    return
+                
+                token = _discovery_sink.set(discovered)
+                with track_usage() as tracker:
+                    try:
+                        companies_data, _ = await self._agent(search_task, controller).run()
+                    finally:
+                        _discovery_sink.reset(token)
+                        # Поиск оплачивается, даже если его ответ не удалось использовать
+                        self._spend(agent_usage(tracker, self.model_name, search_task))
             
-            # Запускаем анализ параллельно
-            results = await asyncio.gather(*tasks)
-            return [r for r in results if r is not None]
+            # Компании, которые агент вернул только в итоговом ответе
+            for company in companies_data or []:
+                if isinstance(company, dict):
+                    await discovered(company)
+            logger.info(f"Search for {search_query} finished: {len(seen)} companies found")
             
         except Exception as e:
             logger.error(f"Error in search process: {str(e)}")
-            return []
 
     async def search_companies(self):
-        """Основной метод поиска компаний"""
-        tasks = []
-        for query in self.config["search_queries"]:
-            tasks.append(self.search_and_analyze_companies(query))
-        
-        results = await asyncio.gather(*tasks)
-        for result_list in results:
-            if result_list:
-                self.companies_data.extend(result_list)
-
-    def save_to_excel(self, filename: str = "companies_data.xlsx"):
-        """Сохраняет результаты в Excel"""
-        if not self.companies_data:
+        """Поиск и анализ конвейером: компании анализируются, пока поиск еще идет"""
+        # С одним браузером поиск, ждущий места в очереди, занял бы его навсегда - очередь без предела
+        queue: asyncio.Queue = asyncio.Queue(ANALYSIS_QUEUE_SIZE if self.max_parallel > 1 else 0)
+        # Домены, уже поставленные в работу в этом запуске любым из запросов
+        scheduled = set()
+        
+        async def schedule(company: Dict, query: str, writer):
+            """Отсеивает известные компании до того, как на них потратится браузер"""
+            domain = CompanyIndex.domain(company['website']) or company['website']
+            if domain in scheduled:
+                return
+            scheduled.add(domain)
+            known = self.index.get(domain) if self.index else None
+            if known is not None:
+                writer.write({**known, **Usage().columns()})
+                writer.flush()
+                self.saved += 1
+                return
+            await queue.put({**company, "domain": domain, "query": query})
+        
+        async def analysis_worker(writer):
+            while True:
+                company = await queue.get()
+                if company is None:
+                    return
+                try:
+                    record = await self.analyze_company(company)
+                except Exception as e:
+                    logger.error(f"Error analyzing {company['website']}: {str(e)}")
+                    continue
+                if record is not None:
+                    if self.index:
+                        result = {key: value for key, value in record.items() if key not in USAGE_COLUMNS}
+                        self.index.put(company['domain'], result, company['query'])
+                    writer.write(record)
+                    writer.flush()
+                    self.saved += 1
+        
+        with open_writer(self.output_file, RESULT_COLUMNS) as writer:
+            workers = [asyncio.create_task(analysis_worker(writer)) for _ in range(self.max_parallel)]
+            try:
+                await asyncio.gather(*[
+                    self.search(query, partial(schedule, query=query, writer=writer))
+                    for query in self.config["search_queries"]
+                ])
+                for _ in workers:
+                    await queue.put(None)
+                await asyncio.gather(*workers)
+            finally:
+                for worker in workers:
+                    worker.cancel()
+        
+        if self.saved:
+            logger.info(f"{self.saved} companies saved to {self.output_file}")
+        else:
             logger.warning("No data to save")
-            return
-            
-        df = pd.DataFrame(self.companies_data)
-        df.to_excel(filename, index=False)
-        logger.info(f"Results saved to {filename}")
 
     async def cleanup(self):
         """Закрывает все браузеры"""
-        for controller in self.controllers:
-            await controller.close()
+        await self.pool.close()
+        if self.cache:
+            self.cache.close()
+        if self.index:
+            self.index.close()
+        await close_model_clients()
 
 async def main():
     load_dotenv()
@@ -169,7 +314,13 @@ async def main():
     searcher = CompanySearcher(max_parallel=3)  # Запускаем 3 параллельных процесса
     try:
         await searcher.search_companies()
-        searcher.save_to_excel()
+        if searcher.cache:
+            logger.info(searcher.cache.stats())
+        if searcher.index:
+            logger.info(searcher.index.stats())
+        logger.info(
+            f"Run usage: {searcher.usage.tokens} tokens, ${searcher.usage.cost:.4f}"
+        )
     finally:
         await searcher.cleanup()
 
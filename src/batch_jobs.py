@@ -0,0 +1,223 @@
+import asyncio
+import json
+import logging
+import shutil
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Статусы задания, общие для всех бэкендов
+IN_PROGRESS = "in_progress"
+COMPLETED = "completed"
+FAILED = "failed"
+
+
+def write_jsonl(path: Path, entries: Iterable[Dict[str, Any]]) -> int:
+    """Пишет записи в JSONL файл, возвращает их количество.
+
+    Формат запроса задания не зависит от провайдера:
+    {"custom_id": ..., "model": ..., "temperature": ..., "prompt": ...}
+    """
+    count = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        for entry in entries:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+
+def read_jsonl(path: Path) -> Iterable[Dict[str, Any]]:
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+class BatchBackend:
+    """Интерфейс бэкенда пакетных заданий"""
+
+    async def submit(self, requests_path: Path) -> str:
+        """Отправляет файл запросов, возвращает идентификатор задания"""
+        raise NotImplementedError
+
+    async def status(self, job_id: str) -> str:
+        """Возвращает IN_PROGRESS, COMPLETED или FAILED"""
+        raise NotImplementedError
+
+    async def results(self, job_id: str) -> Dict[str, str]:
+        """Возвращает тексты ответов по custom_id"""
+        raise NotImplementedError
+
+    async def cleanup(self, job_id: str):
+        """Удаляет рабочие файлы задания после слияния результатов"""
+        pass
+
+    async def wait(self, job_id: str, poll_interval: float = 60,
+                   cancelled: Callable[[], bool] = lambda: False) -> str:
+        """Опрашивает задание до завершения.
+
+        cancelled проверяется каждую секунду между опросами; после отмены
+        возвращается IN_PROGRESS, а само задание продолжает выполняться.
+        """
+        while not cancelled():
+            state = await self.status(job_id)
+            if state != IN_PROGRESS:
+                return state
+            logger.info(f"Batch job {job_id} is still in progress")
+            waited = 0.0
+            while waited < poll_interval and not cancelled():
+                await asyncio.sleep(min(1.0, poll_interval - waited))
+                waited += 1.0
+        return IN_PROGRESS
+
+
+class OpenAIBatchBackend(BatchBackend):
+    """Batch API OpenAI (/v1/chat/completions, окно 24 часа)"""
+
+    def __init__(self, api_key: Optional[str] = None):
+        from openai import AsyncOpenAI
+        self.client = AsyncOpenAI(api_key=api_key)
+
+    async def submit(self, requests_path: Path) -> str:
+        lines = [
+            json.dumps({
+                "custom_id": request["custom_id"],
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": request["model"],
+                    "temperature": request["temperature"],
+                    "messages": [{"role": "user", "content": request["prompt"]}]
+                }
+            }, ensure_ascii=False)
+            for request in read_jsonl(requests_path)
+        ]
+        upload = await self.client.files.create(
+            file=(requests_path.name, "\n".join(lines).encode("utf-8")),
+            purpose="batch"
+        )
+        batch = await self.client.batches.create(
+            input_file_id=upload.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h"
+        )
+        return batch.id
+
+    async def status(self, job_id: str) -> str:
+        batch = await self.client.batches.retrieve(job_id)
+        if batch.status == "completed":
+            return COMPLETED
+        if batch.status in ("failed", "expired", "cancelled"):
+            return FAILED
+        return IN_PROGRESS
+
+    async def results(self, job_id: str) -> Dict[str, str]:
+        batch = await self.client.batches.retrieve(job_id)
+        if not batch.output_file_id:
+            return {}
+        content = await self.client.files.content(batch.output_file_id)
+        results = {}
+        for line in content.text.splitlines():
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            response = entry.get("response") or {}
+            if response.get("status_code") == 200:
+                results[entry["custom_id"]] = response["body"]["choices"][0]["message"]["content"]
+        return results
+
+
+class AnthropicBatchBackend(BatchBackend):
+    """Message Batches API Anthropic"""
+
+    def __init__(self, api_key: Optional[str] = None, max_tokens: int = 4096):
+        from anthropic import AsyncAnthropic
+        self.client = AsyncAnthropic(api_key=api_key)
+        self.max_tokens = max_tokens
+
+    async def submit(self, requests_path: Path) -> str:
+        batch = await self.client.messages.batches.create(requests=[
+            {
+                "custom_id": request["custom_id"],
+                "params": {
+                    "model": request["model"],
+                    "max_tokens": self.max_tokens,
+                    "temperature": request["temperature"],
+                    "messages": [{"role": "user", "content": request["prompt"]}]
+                }
+            }
+            for request in read_jsonl(requests_path)
+        ])
+        return batch.id
+
+    async def status(self, job_id: str) -> str:
+        batch = await self.client.messages.batches.retrieve(job_id)
+        return COMPLETED if batch.processing_status == "ended" else IN_PROGRESS
+
+    async def results(self, job_id: str) -> Dict[str, str]:
+        results = {}
+        async for entry in await self.client.messages.batches.results(job_id):
+            if entry.result.type == "succeeded":
+                results[entry.custom_id] = entry.result.message.content[0].text
+        return results
+
+
+class LocalBatchBackend(BatchBackend):
+    """Файловый бэкенд для офлайн проверки всего цикла.
+
+    Задание - каталог work_dir/<job_id> с requests.jsonl. Оно считается
+    завершенным, когда рядом появляется results.jsonl со строками
+    {"custom_id": ..., "text": ...}. Если передан responder, результаты
+    формируются им при первом опросе.
+    """
+
+    def __init__(self, work_dir: str = "batch_jobs", responder: Optional[Callable[[Dict[str, Any]], str]] = None):
+        self.work_dir = Path(work_dir)
+        self.responder = responder
+
+    def _job_dir(self, job_id: str) -> Path:
+        return self.work_dir / job_id
+
+    async def submit(self, requests_path: Path) -> str:
+        job_id = f"local-{uuid.uuid4().hex[:12]}"
+        job_dir = self._job_dir(job_id)
+        job_dir.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(requests_path, job_dir / "requests.jsonl")
+        return job_id
+
+    async def status(self, job_id: str) -> str:
+        job_dir = self._job_dir(job_id)
+        if not job_dir.exists():
+            return FAILED
+        results_path = job_dir / "results.jsonl"
+        if not results_path.exists() and self.responder:
+            tmp_path = results_path.with_suffix(".tmp")
+            write_jsonl(tmp_path, (
+                {"custom_id": request["custom_id"], "text": self.responder(request)}
+                for request in read_jsonl(job_dir / "requests.jsonl")
+            ))
+            tmp_path.replace(results_path)
+        return COMPLETED if results_path.exists() else IN_PROGRESS
+
+    async def results(self, job_id: str) -> Dict[str, str]:
+        return {
+            entry["custom_id"]: entry["text"]
+            for entry in read_jsonl(self._job_dir(job_id) / "results.jsonl")
+        }
+
+    async def cleanup(self, job_id: str):
+        shutil.rmtree(self._job_dir(job_id), ignore_errors=True)
+
+
+def get_batch_backend(name: str, config: "Config") -> BatchBackend:
+    """Создает бэкенд пакетных заданий по имени из профиля"""
+    if name == "openai":
+        return OpenAIBatchBackend(api_key=config.api_keys.openai)
+    elif name == "anthropic":
+        return AnthropicBatchBackend(api_key=config.api_keys.anthropic)
+    elif name == "local":
+        return LocalBatchBackend()
+    else:
+        raise ValueError(f"Unsupported batch backend: {name}")
@@ -0,0 +1,67 @@
+import json
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+from .structured import extract_json
+
+BATCH_INSTRUCTIONS = """You will perform the task below for several input rows at once.
+The task is written for a single row: values in curly braces refer to the fields of each row.
+
+TASK:
+{task}
+
+ROWS (JSON array, each row has a "row_id"):
+{rows}
+
+Answer strictly with a JSON array and no additional text: exactly one object per row,
+each object must contain the "row_id" of its row plus the fields requested by the task."""
+
+
+def chunked(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """Лениво разбивает поток на пачки фиксированного размера"""
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def prompt_fields(prompt: str, item: Dict[str, Any]) -> Dict[str, Any]:
+    """Поля строки, которые используются в шаблоне промпта"""
+    used = {key: value for key, value in item.items() if f"{{{key}}}" in prompt}
+    return used or item
+
+
+def build_batch_prompt(prompt: str, rows: List[Tuple[str, Dict[str, Any]]]) -> str:
+    """Упаковывает несколько строк в один запрос: шаблон задачи отправляется один раз"""
+    payload = [
+        {"row_id": row_id, **prompt_fields(prompt, item)}
+        for row_id, item in rows
+    ]
+    # По одной строке на линию: компактно, но модель легко сопоставляет row_id
+    rows_json = "[\n" + ",\n".join(
+        json.dumps(row, ensure_ascii=False, default=str) for row in payload
+    ) + "\n]"
+    return BATCH_INSTRUCTIONS.format(task=prompt, rows=rows_json)
+
+
+def split_batch_response(text: str, row_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Разбирает ответ на пачку в словарь row_id -> результат.
+
+    Бросает ValueError, если ответ не является JSON массивом объектов.
+    Строки, для которых модель не вернула объект, в словарь не попадают.
+    """
+    data = extract_json(text)
+    if not isinstance(data, list):
+        raise ValueError("Batch response is not a JSON array")
+
+    expected = set(row_ids)
+    results = {}
+    for entry in data:
+        if not isinstance(entry, dict):
+            raise ValueError("Batch response contains a non-object entry")
+        row_id = str(entry.pop("row_id", ""))
+        if row_id in expected:
+            results[row_id] = entry
+    return results
@@ -1,48 +1,122 @@
 from browser_use import Agent, Controller
-from langchain_openai import ChatOpenAI
-from typing import Dict, Any, List
-import asyncio
+from typing import Dict, Any, List, Optional
+import json
 import logging
+import time
+
+from .browser_resources import bind_resource_policy, prepare_controller
+from .checkpoint import STATUS_COLUMN, STATUS_TIMEOUT
+from .config import BrowserConfig
+from .controller_pool import ControllerPool
+from .deadlines import RowDeadline, StageTimeout
+from .llm_cache import LLMCache
+from .metrics import METRICS
+from .models import get_model
+from .usage import agent_usage, track_usage
 
 logger = logging.getLogger(__name__)
 
 class BrowserManager:
-    def __init__(self, config: "Config"):
+    def __init__(self, config: "Config", cache: Optional[LLMCache] = None):
         self.config = config
-        self.controllers = [
-            Controller(headless=config.browser_config.headless) 
-            for _ in range(config.browser_config.max_parallel)
-        ]
-        self.semaphore = asyncio.Semaphore(config.browser_config.max_parallel)
+        self.cache = cache
+        profile = config.profiles[config.profile_name]
+        browser_config = profile.browser_config or BrowserConfig()
+        self.browser_config = browser_config
+        # Each task checks out an idle controller, so N browsers give N-way parallelism
+        self.pool = ControllerPool(self._new_controller, browser_config.max_parallel)
+        
+        # The agent uses the profile's model through the shared client registry;
+        # the limited client throttles and retries every call the agent makes
+        self.model_name = profile.model
+        self.temperature = profile.temperature
+        self.llm = get_model(config, limited=True)
+        self.labels = {"profile": config.profile_name, "model": profile.model}
+    
+    def _time_agent_steps(self, agent: Agent):
+        """Records each agent step in the stage histograms when metrics are enabled"""
+        step = getattr(agent, "step", None)
+        if step is None or not METRICS.enabled:
+            return
         
-        self.llm = ChatOpenAI(
-            api_key=config.openai_key,
-            model="gpt-4-turbo-preview",
-            temperature=0
+        async def timed_step(*args, **kwargs):
+            with METRICS.timer("agent_step", **self.labels):
+                return await step(*args, **kwargs)
+        
+        agent.step = timed_step
+    
+    def _new_controller(self) -> Controller:
+        controller = Controller(headless=self.browser_config.headless)
+        prepare_controller(controller, self.browser_config.resource_policy)
+        return controller
+    
+    def new_deadline(self) -> RowDeadline:
+        """Row budget with the profile's navigation and step limits"""
+        return RowDeadline(
+            self.browser_config.timeout,
+            navigation=self.browser_config.navigation_timeout,
+            step=self.browser_config.step_timeout
         )
     
-    async def process_item(self, item: Dict[str, Any], prompt: str, controller_idx: int) -> Dict[str, Any]:
-        """Process single item using browser"""
-        async with self.semaphore:
-            # Replace variables in prompt
-            formatted_prompt = prompt
-            for key, value in item.items():
-                formatted_prompt = formatted_prompt.replace(f"{{{key}}}", str(value))
+    async def process_item(self, item: Dict[str, Any], prompt: str,
+                           deadline: Optional[RowDeadline] = None) -> Dict[str, Any]:
+        """Process single item using browser.
+        
+        A deadline passed by the caller is the row's shared budget, already partly
+        spent by earlier tiers; otherwise the row gets a fresh one.
+        """
+        # Replace variables in prompt
+        formatted_prompt = prompt
+        for key, value in item.items():
+            formatted_prompt = formatted_prompt.replace(f"{{{key}}}", str(value))
+        
+        # Agent results are cached under a separate key space from plain LLM calls,
+        # a cache hit does not occupy a browser slot
+        cache_model = f"browser:{self.model_name}"
+        if self.cache:
+            cached = self.cache.get(cache_model, self.temperature, formatted_prompt)
+            if cached is not None:
+                return {**item, **json.loads(cached)}
+        
+        waiting = time.perf_counter()
+        async with self.pool.checkout() as controller:
+            waited = time.perf_counter() - waiting
+            METRICS.observe("controller_wait", waited, **self.labels)
+            # The row budget does not include waiting for a free controller
+            if deadline is None:
+                deadline = self.new_deadline()
+            else:
+                deadline.exclude(waited)
             
-            agent = Agent(
-                task=formatted_prompt,
-                llm=self.llm,
-                controller=self.controllers[controller_idx]
-            )
+            async def run_agent():
+                agent = Agent(
+                    task=formatted_prompt,
+                    llm=self.llm,
+                    controller=controller
+                )
+                # Resource blocking goes inside the deadline, so its setup counts towards the step budget
+                bind_resource_policy(agent, controller, self.browser_config.resource_policy)
+                deadline.bound_agent_steps(agent)
+                self._time_agent_steps(agent)
+                with METRICS.timer("agent_run", **self.labels):
+                    return await agent.run()
             
-            try:
-                result, _ = await agent.run()
-                return {**item, **result}
-            except Exception as e:
-                logger.error(f"Error processing item {item}: {str(e)}")
-                return None
+            with track_usage() as tracker:
+                try:
+                    result, _ = await deadline.run(run_agent())
+                    if self.cache:
+                        self.cache.set(cache_model, self.temperature, formatted_prompt, json.dumps(result, ensure_ascii=False))
+                    return {**item, **result, **agent_usage(tracker, self.model_name, formatted_prompt, result).columns()}
+                except StageTimeout as e:
+                    logger.warning(f"Timeout processing item {item}: {str(e)}")
+                    # The page may still be loading or the agent mid-action, start over with a clean browser
+                    await self.pool.replace(controller)
+                    # Steps taken before the timeout are still billed
+                    return {**item, STATUS_COLUMN: STATUS_TIMEOUT, **agent_usage(tracker, self.model_name, formatted_prompt).columns()}
+                except Exception as e:
+                    logger.error(f"Error processing item {item}: {str(e)}")
+                    return None
     
     async def cleanup(self):
         """Close all browser instances"""
-        for controller in self.controllers:
-            await controller.close() 
\ No newline at end of file
+        await self.pool.close() 
\ No newline at end of file
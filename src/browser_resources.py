@@ -0,0 +1,172 @@
+import logging
+from typing import Any, List, Optional
+from urllib.parse import urlsplit
+
+from .config import ResourcePolicy
+
+logger = logging.getLogger(__name__)
+
+# Отключает CSS анимации и автозапуск медиа на каждой странице контекста
+DISABLE_ANIMATIONS_SCRIPT = """
+(() => {
+    const style = document.createElement('style');
+    style.textContent = '*, *::before, *::after { animation: none !important; ' +
+        'transition: none !important; scroll-behavior: auto !important; }';
+    document.addEventListener('DOMContentLoaded', () => document.head.appendChild(style));
+    const stop = (el) => { try { el.autoplay = false; el.pause(); } catch (e) {} };
+    new MutationObserver(() => document.querySelectorAll('video, audio').forEach(stop))
+        .observe(document, { childList: true, subtree: true });
+})();
+"""
+
+
+def chromium_args(policy: ResourcePolicy) -> List[str]:
+    """Флаги запуска Chromium, которые действуют еще до установки перехвата запросов"""
+    args = ["--autoplay-policy=user-gesture-required", "--mute-audio"]
+    if "image" in policy.block_types:
+        args.append("--blink-settings=imagesEnabled=false")
+    if "font" in policy.block_types:
+        args.append("--disable-remote-fonts")
+    if policy.disable_animations:
+        args.append("--force-prefers-reduced-motion")
+    return args
+
+
+def is_blocked_domain(url: str, policy: ResourcePolicy) -> bool:
+    host = (urlsplit(url).hostname or "").lower()
+    return any(host == domain or host.endswith("." + domain) for domain in policy.block_domains)
+
+
+class PageWeightGuard:
+    """Считает загруженные байты документа и отсекает ресурсы сверх лимита"""
+
+    def __init__(self, limit_kb: int):
+        self.limit = limit_kb * 1024
+        self.loaded = 0
+
+    def on_response(self, response: Any):
+        if response.request.resource_type == "document":
+            # Новая навигация начинает отсчет заново
+            self.loaded = 0
+        try:
+            self.loaded += int(response.headers.get("content-length", 0))
+        except (TypeError, ValueError):
+            pass
+
+    def exceeded(self) -> bool:
+        return bool(self.limit) and self.loaded > self.limit
+
+
+# Атрибуты, по которым из агента и контроллера browser_use добираемся до контекста Playwright
+_CONTEXT_PATH = ("browser", "browser_context", "context", "session", "playwright_context")
+
+
+def _find_context(*owners: Any) -> Optional[Any]:
+    """Ищет контекст Playwright в агенте и контроллере browser_use.
+
+    В версиях browser_use на Playwright браузер и контекст принадлежат агенту
+    (agent.browser_context.session.context), контроллер хранит только registry.
+    """
+    candidates = [owner for owner in owners if owner is not None]
+    # Список растет по ходу обхода: проверяются и вложенные объекты любой глубины
+    for obj in candidates:
+        for attr in _CONTEXT_PATH:
+            value = getattr(obj, attr, None)
+            if value is not None and not any(value is known for known in candidates):
+                candidates.append(value)
+    for obj in candidates:
+        if hasattr(obj, "route") and hasattr(obj, "add_init_script"):
+            return obj
+    return None
+
+
+def _add_chromium_args(owner: Any, policy: ResourcePolicy):
+    """Дописывает флаги Chromium в конфиг браузера owner, если он еще не запущен"""
+    config = getattr(getattr(owner, "browser", None), "config", None)
+    extra = getattr(config, "extra_chromium_args", None)
+    if isinstance(extra, list):
+        extra.extend(arg for arg in chromium_args(policy) if arg not in extra)
+
+
+def prepare_controller(controller: Any, policy: Optional[ResourcePolicy]):
+    """Добавляет флаги Chromium в конфиг браузера контроллера до его запуска (старые версии browser_use)"""
+    if policy:
+        _add_chromium_args(controller, policy)
+
+
+async def install_resource_policy(policy: Optional[ResourcePolicy], *owners: Any) -> bool:
+    """Устанавливает перехват запросов в контексте браузера агента или контроллера.
+
+    Повторный вызов для того же контекста ничего не делает. Возвращает False,
+    если контекст браузера еще не создан или недоступен.
+    """
+    if not policy:
+        return True
+    context = _find_context(*owners)
+    if context is None:
+        return False
+    if getattr(context, "_resource_policy_installed", False):
+        return True
+
+    block_types = set(policy.block_types)
+    guard = PageWeightGuard(policy.max_page_weight_kb)
+
+    async def handle(route):
+        request = route.request
+        if request.resource_type != "document" and (
+            request.resource_type in block_types
+            or is_blocked_domain(request.url, policy)
+            or guard.exceeded()
+        ):
+            await route.abort()
+        else:
+            await route.continue_()
+
+    await context.route("**/*", handle)
+    if policy.max_page_weight_kb:
+        context.on("response", guard.on_response)
+    if policy.disable_animations:
+        await context.add_init_script(DISABLE_ANIMATIONS_SCRIPT)
+    context._resource_policy_installed = True
+    return True
+
+
+def bind_resource_policy(agent: Any, controller: Any, policy: Optional[ResourcePolicy]):
+    """Устанавливает политику перед шагами агента, как только появится контекст браузера.
+
+    Флаги Chromium попадают в конфиг браузера агента до его ленивого запуска.
+    Контекст browser_use тоже создает лениво: он открывается заранее, если
+    это возможно, иначе попытка повторяется после первого шага. Если контекст
+    так и не найден, политика не действует, и об этом пишется предупреждение.
+    """
+    step = getattr(agent, "step", None)
+    if not policy or step is None:
+        return
+    _add_chromium_args(agent, policy)
+    installed = False
+    steps = 0
+
+    async def install() -> bool:
+        if _find_context(agent, controller) is None:
+            # Сессия browser_use создает контекст Playwright до первой навигации
+            get_session = getattr(getattr(agent, "browser_context", None), "get_session", None)
+            if get_session is not None:
+                await get_session()
+        return await install_resource_policy(policy, agent, controller)
+
+    async def step_with_policy(*args, **kwargs):
+        nonlocal installed, steps
+        if not installed:
+            try:
+                installed = await install()
+                # После первого шага контекст уже должен существовать
+                if not installed and steps:
+                    logger.warning("No browser context found on the agent or controller, resource policy is not applied")
+                    installed = True
+            except Exception as e:
+                logger.warning(f"Could not install resource policy: {str(e)}")
+                installed = True
+        steps += 1
+        return await step(*args, **kwargs)
+
+    agent.step = step_with_policy
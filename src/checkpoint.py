@@ -0,0 +1,114 @@
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Служебная колонка выходного файла со статусом строки
+STATUS_COLUMN = "row_status"
+STATUS_OK = "ok"
+STATUS_TIMEOUT = "timeout"
+
+
+class CheckpointStore:
+    """Append-only JSONL хранилище результатов строк.
+
+    Каждая завершенная строка сразу дописывается в файл рядом с выходным,
+    поэтому при падении процесса оплаченные ответы модели не теряются.
+    """
+
+    def __init__(self, path: Path, run_key: str = ""):
+        self.path = Path(path)
+        self.run_key = run_key
+        self._occurrences: Dict[str, int] = {}
+        self._file = None
+
+    @classmethod
+    def for_output(cls, output_file: Path, run_key: str = "") -> "CheckpointStore":
+        """Создает хранилище рядом с выходным файлом"""
+        output_file = Path(output_file)
+        return cls(output_file.with_name(output_file.name + ".checkpoint.jsonl"), run_key)
+
+    def fingerprint(self, item: Dict[str, Any]) -> str:
+        """Стабильный отпечаток строки: содержимое, параметры запуска и номер повтора"""
+        content = json.dumps(item, sort_keys=True, ensure_ascii=False, default=str)
+        digest = hashlib.sha1((self.run_key + "\n" + content).encode("utf-8")).hexdigest()
+        # Одинаковые строки различаем по порядковому номеру вхождения
+        occurrence = self._occurrences.get(digest, 0)
+        self._occurrences[digest] = occurrence + 1
+        return f"{digest}:{occurrence}"
+
+    def records(self) -> Iterator[Dict[str, Any]]:
+        """Читает сохраненные записи, пропуская оборванную при падении строку"""
+        if not self.path.exists():
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"Skipping damaged checkpoint line in {self.path}")
+
+    def offsets(self) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """Записи вместе со смещением в файле, чтобы потом перечитать запись без хранения в памяти"""
+        if not self.path.exists():
+            return
+        with open(self.path, 'rb') as f:
+            offset = 0
+            for line in f:
+                try:
+                    yield offset, json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"Skipping damaged checkpoint line in {self.path}")
+                offset += len(line)
+
+    def records_at(self, offsets: Iterable[int]) -> Iterator[Dict[str, Any]]:
+        """Читает записи по смещениям из offsets() в заданном порядке"""
+        with open(self.path, 'rb') as f:
+            for offset in offsets:
+                f.seek(offset)
+                yield json.loads(f.readline())
+
+    def completed(self) -> Set[str]:
+        """Отпечатки успешно обработанных строк; строки с таймаутом повторяются при resume"""
+        return {
+            record["fingerprint"] for record in self.records()
+            if record.get("status", STATUS_OK) == STATUS_OK
+        }
+
+    def open(self, resume: bool = True):
+        """Открывает файл на дозапись; без resume начинает с чистого листа"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, 'a' if resume else 'w', encoding='utf-8')
+        # Оборванная при падении строка не должна склеиться со следующей записью
+        if resume and self._file.tell() > 0:
+            with open(self.path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    self._file.write("\n")
+
+    def append(self, fingerprint: str, idx: int, result: Dict[str, Any]):
+        """Дописывает результат строки и сбрасывает его на диск"""
+        record = {
+            "fingerprint": fingerprint,
+            "idx": idx,
+            "status": result.get(STATUS_COLUMN, STATUS_OK),
+            "result": result
+        }
+        self._file.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def remove(self):
+        """Удаляет файл после успешной сборки итогового результата"""
+        self.close()
+        if self.path.exists():
+            self.path.unlink()
@@ -0,0 +1,91 @@
+"""Запуск профиля без GUI: python -m src.cli --config config.json --input in.csv --output out.csv
+
+Не требует Tk и дисплея. browser_use и SDK провайдеров загружаются,
+только если они нужны выбранному профилю.
+"""
+import time
+
+_STARTED = time.perf_counter()
+
+import argparse
+import asyncio
+import logging
+import sys
+from pathlib import Path
+
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m src.cli", description="Run a profile against an input file")
+    parser.add_argument("--config", default="config.json", help="path to config.json")
+    parser.add_argument("--profile", help="profile name, defaults to the one in config.json")
+    parser.add_argument("--input", type=Path, help="input file, defaults to the one in config.json")
+    parser.add_argument("--output", type=Path, help="output file, defaults to the one in config.json")
+    parser.add_argument("--no-resume", action="store_true", help="ignore the checkpoint of a previous run")
+    parser.add_argument("--worker", action="store_true", help="serve the profile's job queue instead of running the job")
+    parser.add_argument("--keep-running", action="store_true", help="worker waits for new rows when the job is empty")
+    parser.add_argument("--log-level", default="INFO")
+    return parser.parse_args(argv)
+
+
+def load_config(args: argparse.Namespace) -> Config:
+    config = Config.load(args.config)
+    if args.profile:
+        if args.profile not in config.profiles:
+            raise SystemExit(f"Unknown profile '{args.profile}'")
+        config.profile_name = args.profile
+    if args.input:
+        config.input_file = args.input
+    if args.output:
+        config.output_file = args.output
+    return config
+
+
+async def run(config: Config, args: argparse.Namespace):
+    profile = config.profiles[config.profile_name]
+    resume = not args.no_resume
+    imports_started = time.perf_counter()
+
+    if profile.shards > 1 and not args.worker:
+        from .sharding import ShardedRunner
+        runner = ShardedRunner(config, resume=resume)
+        logger.info(f"Startup: {imports_started - _STARTED:.2f}s, "
+                    f"runner ready in {time.perf_counter() - imports_started:.2f}s")
+        await runner.run()
+        return
+
+    from .data_processor import DataProcessor
+    processor = DataProcessor(config, resume=resume)
+    logger.info(
+        f"Startup: {imports_started - _STARTED:.2f}s, "
+        f"processor ready in {time.perf_counter() - imports_started:.2f}s "
+        f"(browser: {'yes' if processor.browser_manager else 'no'}, "
+        f"modules loaded: {len(sys.modules)})"
+    )
+    try:
+        if args.worker:
+            processed = await processor.serve_queue(keep_running=args.keep_running)
+            logger.info(f"Worker finished, {processed} units processed")
+        else:
+            await processor.process_data()
+    finally:
+        await processor.cleanup()
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    config = load_config(args)
+    if not config.input_file.exists() and not args.worker:
+        raise SystemExit(f"Input file not found: {config.input_file}")
+
+    started = time.perf_counter()
+    asyncio.run(run(config, args))
+    logger.info(f"Finished in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from .dedup import registrable_domain
+
+logger = logging.getLogger(__name__)
+
+
+class CompanyIndex:
+    """Персистентный индекс проанализированных компаний на SQLite.
+
+    Ключ - регистрируемый домен сайта, поэтому www.example.com, example.com/about
+    и shop.example.com считаются одной компанией. Запись хранит результат
+    анализа, время и поисковый запрос, который нашел компанию. Записи старше
+    freshness_seconds не возвращаются, и компания анализируется заново.
+    """
+
+    def __init__(self, path: str = "company_index.sqlite", freshness_seconds: int = 30 * 24 * 3600):
+        self.path = path
+        self.freshness_seconds = freshness_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS companies (
+                domain TEXT PRIMARY KEY,
+                result TEXT NOT NULL,
+                query TEXT,
+                analyzed_at REAL NOT NULL
+            )"""
+        )
+
+    @staticmethod
+    def domain(website: str) -> str:
+        """Ключ индекса; пустая строка - адрес не удалось разобрать"""
+        try:
+            return registrable_domain(website)
+        except ValueError:
+            return ""
+
+    def get(self, domain: str) -> Optional[Dict[str, Any]]:
+        """Свежий результат анализа компании или None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result, analyzed_at FROM companies WHERE domain = ?", (domain,)
+            ).fetchone()
+        if row is None or time.time() - row[1] > self.freshness_seconds:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, domain: str, result: Dict[str, Any], query: Optional[str] = None):
+        """Сохраняет результат анализа; повторный анализ перезаписывает старый"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO companies VALUES (?, ?, ?, ?)",
+                (domain, json.dumps(result, ensure_ascii=False, default=str), query, time.time())
+            )
+
+    def stats(self) -> str:
+        return f"Company index: {self.hits} known companies reused, {self.misses} new"
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -1,4 +1,4 @@
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass, field
 from typing import List, Optional, Dict, Any
 import json
 import os
@@ -6,13 +6,51 @@ from pathlib import Path
 from cryptography.fernet import Fernet
 import base64
 
-@dataclass
+# Трекеры и рекламные сети, которые не нужны для чтения текста страниц
+DEFAULT_BLOCKED_DOMAINS = [
+    "doubleclick.net", "googlesyndication.com", "google-analytics.com", "googletagmanager.com",
+    "googleadservices.com", "facebook.net", "connect.facebook.net", "hotjar.com", "mc.yandex.ru",
+    "scorecardresearch.com", "adnxs.com", "criteo.com", "taboola.com", "outbrain.com",
+    "segment.io", "mixpanel.com", "intercom.io", "hubspot.com", "clarity.ms"
+]
+
+def atomic_write(path: str, data: bytes):
+    """Пишет файл целиком через временный файл: читатель видит старую или новую версию, не половину"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as file:
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+
+@dataclass(frozen=True)
+class ResourcePolicy:
+    """Какие ресурсы браузер не загружает при обработке страниц"""
+    # Типы ресурсов Playwright: image, media, font, stylesheet, ...
+    block_types: List[str] = field(default_factory=lambda: ["image", "media", "font"])
+    block_domains: List[str] = field(default_factory=lambda: list(DEFAULT_BLOCKED_DOMAINS))
+    disable_animations: bool = True
+    # Сколько килобайт страницы дожидаться, 0 - без ограничения
+    max_page_weight_kb: int = 0
+
+@dataclass(frozen=True)
 class BrowserConfig:
     max_parallel: int = 3
     headless: bool = True
+    # Общий лимит времени на строку, секунды
     timeout: int = 30
+    # Бюджеты открытия сайта и одного шага агента внутри общего лимита
+    navigation_timeout: int = 15
+    step_timeout: int = 20
+    # Блокировка лишних ресурсов; None - страницы грузятся целиком
+    resource_policy: Optional[ResourcePolicy] = None
 
-@dataclass
+    def __post_init__(self):
+        if isinstance(self.resource_policy, dict):
+            # Экземпляр неизменяемый, поэтому поле заменяем в обход __setattr__
+            object.__setattr__(self, "resource_policy", ResourcePolicy(**self.resource_policy))
+
+@dataclass(frozen=True)
 class Profile:
     name: str
     description: str
@@ -23,6 +61,38 @@ class Profile:
     temperature: float = 0.0
     use_browser: bool = True
     browser_config: Optional[BrowserConfig] = None
+    # Число воркеров для офлайн режима (в онлайн режиме равно max_parallel)
+    max_workers: int = 10
+    # Сколько строк упаковывать в один запрос к модели в офлайн режиме (1 - без пачек)
+    batch_size: int = 1
+    # Бэкенд пакетных заданий: "openai", "anthropic" или "local" (None - обычный режим)
+    batch_backend: Optional[str] = None
+    batch_poll_interval: int = 60
+    # Онлайн режим: сначала пробовать текст страниц по HTTP, браузер - только при необходимости
+    tiered_fetch: bool = False
+    # Колонка входных данных с адресом сайта
+    url_column: str = "website"
+    # Нормализация колонок перед дедупликацией: {"website": "domain"}; правила domain, url, lower, strip
+    normalize_rules: Dict[str, str] = field(default_factory=dict)
+    # Кэшировать ответы модели на диске (только при temperature == 0)
+    use_cache: bool = True
+    # Число процессов, между которыми делится вход (1 - все в текущем процессе)
+    shards: int = 1
+    # Колонка для разбиения на шарды; по умолчанию url_column
+    shard_column: Optional[str] = None
+    # Очередь для распределенных воркеров: "sqlite:///job_queue.sqlite" или "redis://host:6379/0"
+    job_queue: Optional[str] = None
+    # Через сколько секунд арендованная строка возвращается в очередь
+    lease_timeout: int = 300
+    # Гистограммы этапов и сводка <выходной файл>.metrics.json; порт > 0 включает эндпоинт /metrics
+    metrics: bool = False
+    metrics_port: int = 0
+    # Бюджет запуска в USD: по его достижении новые строки не отправляются (None - без ограничения)
+    max_cost_usd: Optional[float] = None
+    # Нативный JSON режим провайдера со схемой из output_columns
+    structured_output: bool = False
+    # Формат итогового файла: "xlsx", "csv", "jsonl" или "parquet" (None - по расширению выходного файла)
+    output_format: Optional[str] = None
 
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> "Profile":
@@ -36,7 +106,7 @@ class Profile:
         
         return cls(**profile_data)
 
-@dataclass
+@dataclass(frozen=True)
 class APIKeys:
     openai: Optional[str] = None
     anthropic: Optional[str] = None
@@ -71,8 +141,7 @@ class APIKeys:
         }
         
         encrypted_data = f.encrypt(json.dumps(data).encode())
-        with open(path, 'wb') as file:
-            file.write(encrypted_data)
+        atomic_write(path, encrypted_data)
 
 @dataclass
 class Config:
@@ -83,7 +152,7 @@ class Config:
     api_keys: APIKeys
     
     @classmethod
-    def load(cls, config_path: str = "config.json") -> "Config":
+    def load(cls, config_path: str = "config.json", api_keys: Optional[APIKeys] = None) -> "Config":
         with open(config_path, 'r', encoding='utf-8') as f:
             data = json.load(f)
             
@@ -93,8 +162,9 @@ class Config:
             for name, profile_data in data.get("profiles", {}).items()
         }
         
-        # Загружаем API ключи
-        api_keys = APIKeys.load()
+        # Загружаем API ключи, если вызывающий не передал уже расшифрованные
+        if api_keys is None:
+            api_keys = APIKeys.load()
             
         return cls(
             input_file=Path(data["input_file"]),
@@ -120,11 +190,27 @@ class Config:
                     "model": p.model,
                     "temperature": p.temperature,
                     "use_browser": p.use_browser,
-                    "browser_config": vars(p.browser_config) if p.browser_config else None
+                    "browser_config": asdict(p.browser_config) if p.browser_config else None,
+                    "max_workers": p.max_workers,
+                    "batch_size": p.batch_size,
+                    "batch_backend": p.batch_backend,
+                    "batch_poll_interval": p.batch_poll_interval,
+                    "tiered_fetch": p.tiered_fetch,
+                    "url_column": p.url_column,
+                    "normalize_rules": p.normalize_rules,
+                    "use_cache": p.use_cache,
+                    "shards": p.shards,
+                    "shard_column": p.shard_column,
+                    "job_queue": p.job_queue,
+                    "lease_timeout": p.lease_timeout,
+                    "metrics": p.metrics,
+                    "metrics_port": p.metrics_port,
+                    "max_cost_usd": p.max_cost_usd,
+                    "structured_output": p.structured_output,
+                    "output_format": p.output_format
                 }
                 for name, p in self.profiles.items()
             }
         }
         
-        with open(config_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=4) 
\ No newline at end of file
+        atomic_write(config_path, json.dumps(data, indent=4).encode("utf-8")) 
\ No newline at end of file
@@ -0,0 +1,146 @@
+import atexit
+import logging
+import os
+import threading
+from dataclasses import replace
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .config import APIKeys, Config, Profile
+
+logger = logging.getLogger(__name__)
+
+# Пауза после последнего изменения, после которой изменения пишутся на диск, секунды
+WRITE_DELAY = 0.5
+
+
+def _file_version(path: str) -> Optional[Tuple[int, int]]:
+    """mtime и размер файла; None - файла нет"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class ConfigStore:
+    """Конфигурация процесса в памяти.
+
+    config.json перечитывается, только когда меняется его mtime, ключи
+    расшифровываются один раз (и снова - только при изменении keys.enc).
+    Профили и ключи неизменяемые, поэтому их можно отдавать без копирования.
+    Изменения сразу видны в памяти, а на диск пишутся атомарно и с задержкой:
+    серия правок подряд превращается в одну запись.
+    """
+
+    def __init__(self, config_path: str = "config.json", keys_path: str = "keys.enc"):
+        self.config_path = config_path
+        self.keys_path = keys_path
+        self._lock = threading.RLock()
+        self._config: Optional[Config] = None
+        self._config_version: Optional[Tuple[int, int]] = None
+        self._keys: Optional[APIKeys] = None
+        self._keys_version: Optional[Tuple[int, int]] = None
+        self._dirty_config = False
+        self._dirty_keys = False
+        self._timer: Optional[threading.Timer] = None
+
+    def _current(self) -> Config:
+        """Загруженная конфигурация; перечитывает файлы, если их изменили снаружи"""
+        if not self._dirty_keys:
+            version = _file_version(self.keys_path)
+            if self._keys is None or version != self._keys_version:
+                self._keys = APIKeys.load(self.keys_path)
+                self._keys_version = version
+        if not self._dirty_config:
+            version = _file_version(self.config_path)
+            if self._config is None or version != self._config_version:
+                self._config = Config.load(self.config_path, api_keys=self._keys)
+                self._config_version = version
+                logger.debug(f"Loaded {self.config_path}")
+        self._config.api_keys = self._keys
+        return self._config
+
+    def get(self) -> Config:
+        """Снимок конфигурации; его можно менять, не затрагивая хранилище"""
+        with self._lock:
+            config = self._current()
+            return replace(config, profiles=dict(config.profiles))
+
+    def profile(self, name: str) -> Profile:
+        with self._lock:
+            return self._current().profiles[name]
+
+    def profile_names(self) -> List[str]:
+        with self._lock:
+            return list(self._current().profiles)
+
+    def api_keys(self) -> APIKeys:
+        with self._lock:
+            return self._current().api_keys
+
+    def put_profile(self, name: str, profile: Profile):
+        with self._lock:
+            self._current().profiles[name] = profile
+            self._dirty_config = True
+            self._schedule()
+
+    def update(self, **fields):
+        """Меняет поля верхнего уровня: input_file, output_file, profile_name"""
+        with self._lock:
+            config = self._current()
+            for key, value in fields.items():
+                setattr(config, key, value)
+            self._dirty_config = True
+            self._schedule()
+
+    def set_api_keys(self, api_keys: APIKeys):
+        with self._lock:
+            self._current()
+            self._keys = api_keys
+            self._dirty_keys = True
+            self._schedule()
+
+    def _schedule(self):
+        """Откладывает запись; каждое новое изменение сдвигает ее"""
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(WRITE_DELAY, self.flush)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def flush(self):
+        """Пишет накопленные изменения на диск"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self._dirty_keys:
+                self._keys.save(self.keys_path)
+                self._keys_version = _file_version(self.keys_path)
+                self._dirty_keys = False
+            if self._dirty_config:
+                self._config.save(self.config_path)
+                self._config_version = _file_version(self.config_path)
+                self._dirty_config = False
+
+
+_STORES: Dict[str, ConfigStore] = {}
+_STORES_LOCK = threading.Lock()
+
+
+def get_config_store(config_path: str = "config.json") -> ConfigStore:
+    """Хранилище конфигурации, общее для всего процесса"""
+    key = str(Path(config_path).resolve())
+    with _STORES_LOCK:
+        store = _STORES.get(key)
+        if store is None:
+            store = _STORES[key] = ConfigStore(config_path)
+        return store
+
+
+@atexit.register
+def _flush_stores():
+    """Отложенные изменения не теряются при выходе до срабатывания таймера"""
+    for store in list(_STORES.values()):
+        store.flush()
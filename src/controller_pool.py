@@ -0,0 +1,85 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ControllerStats:
+    """Статистика использования одного контроллера"""
+    checkouts: int = 0
+    busy_seconds: float = 0.0
+    wait_seconds: float = 0.0
+    resets: int = 0
+
+
+class ControllerPool:
+    """Пул браузерных контроллеров с выдачей свободного экземпляра.
+
+    Задача берет любой простаивающий контроллер и возвращает его после работы,
+    поэтому один контроллер никогда не используется двумя задачами сразу.
+    Ожидающие задачи обслуживаются в порядке очереди.
+    """
+
+    def __init__(self, factory: Callable[[], Any], size: int):
+        self.factory = factory
+        self.controllers: List[Any] = [factory() for _ in range(size)]
+        self.stats = [ControllerStats() for _ in range(size)]
+        self._idle: asyncio.Queue = asyncio.Queue()
+        for idx in range(size):
+            self._idle.put_nowait(idx)
+        self._started = time.monotonic()
+
+    @property
+    def size(self) -> int:
+        return len(self.controllers)
+
+    @asynccontextmanager
+    async def checkout(self) -> AsyncIterator[Any]:
+        """Выдает свободный контроллер на время блока"""
+        requested = time.monotonic()
+        idx = await self._idle.get()
+        stats = self.stats[idx]
+        started = time.monotonic()
+        stats.checkouts += 1
+        stats.wait_seconds += started - requested
+        try:
+            yield self.controllers[idx]
+        finally:
+            stats.busy_seconds += time.monotonic() - started
+            self._idle.put_nowait(idx)
+
+    async def replace(self, controller: Any):
+        """Закрывает зависший или сломанный контроллер и создает на его месте новый"""
+        idx = self.controllers.index(controller)
+        try:
+            await controller.close()
+        except Exception as e:
+            logger.warning(f"Error closing controller {idx}: {str(e)}")
+        self.controllers[idx] = self.factory()
+        self.stats[idx].resets += 1
+
+    def utilization(self) -> List[Dict[str, float]]:
+        """Доля времени, которую каждый контроллер был занят"""
+        elapsed = max(time.monotonic() - self._started, 1e-9)
+        return [
+            {
+                "controller": idx,
+                "checkouts": stats.checkouts,
+                "resets": stats.resets,
+                "busy": round(stats.busy_seconds / elapsed, 3),
+                "avg_wait": round(stats.wait_seconds / stats.checkouts, 3) if stats.checkouts else 0.0
+            }
+            for idx, stats in enumerate(self.stats)
+        ]
+
+    async def close(self):
+        """Закрывает все контроллеры и пишет статистику загрузки"""
+        for entry in self.utilization():
+            logger.info(f"Controller utilization: {entry}")
+        for controller in self.controllers:
+            await controller.close()
@@ -1,96 +1,677 @@
-from langchain.chat_models.base import BaseChatModel
-from langchain.schema import HumanMessage
-import pandas as pd
 import json
 import asyncio
+import hashlib
 import logging
+import time
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, Any, List
+from typing import Callable, Dict, Any, Iterator, List, Optional, Set, Tuple
 
-from .browser_manager import BrowserManager
-from .config import Config
-from .models import get_model
+from .batch_jobs import COMPLETED, BatchBackend, get_batch_backend, write_jsonl
+from .batching import build_batch_prompt, chunked, split_batch_response
+from .checkpoint import STATUS_COLUMN, STATUS_OK, STATUS_TIMEOUT, CheckpointStore
+from .config import BrowserConfig, Config
+from .dedup import Deduplicator, normalize_item
+from .deadlines import RowDeadline, StageTimeout
+from .fetcher import FetchError, PageFetcher
+from .http_pool import pool_stats
+from .job_queue import JobQueue, get_job_queue
+from .llm_cache import LLMCache
+from .metrics import METRICS, configure_metrics
+from .scheduler import BoundedScheduler
+from .models import AVAILABLE_MODELS, close_model_clients, get_limiter, get_model
+from .rate_limiter import estimate_tokens
+from .readers import InputReader, open_reader
+from .run_control import RunControl
+from .run_stats import RunStats, StatsSnapshot
+from .structured import extract_json, generation_text, repair_prompt, structured_kwargs
+from .usage import USAGE_COLUMNS, Usage, response_usage
+from .writers import open_writer, output_path
 
 logger = logging.getLogger(__name__)
 
+# Как часто координатор и простаивающие воркеры опрашивают очередь, секунды
+QUEUE_POLL_INTERVAL = 2.0
+
+# Колонка с уровнем, который обработал строку в онлайн режиме: http или browser
+TIER_COLUMN = "fetch_tier"
+
+HTTP_TIER_CONTEXT = """
+
+The website pages were already downloaded for you, do not browse. Use only this content:
+{pages}"""
+
+@dataclass
+class RowTask:
+    """Строка входных данных, поставленная в очередь обработки"""
+    idx: int
+    fingerprint: str
+    item: Dict[str, Any]
+    # Строка в исходном виде, если item нормализован
+    original: Optional[Dict[str, Any]] = None
+    # Хеш итогового промпта и строки-дубликаты, ждущие этот же ответ
+    key: str = ""
+    followers: List["RowTask"] = field(default_factory=list)
+
 class DataProcessor:
-    def __init__(self, config: Config):
+    def __init__(self, config: Config, resume: bool = True, control: Optional[RunControl] = None,
+                 on_progress: Optional[Callable[[StatsSnapshot], None]] = None, keep_checkpoint: bool = False):
         self.config = config
+        self.resume = resume
+        # Шард оставляет чекпоинт координатору: тот удалит его после сборки общего выхода
+        self.keep_checkpoint = keep_checkpoint
+        # Все строки обработаны успешно и чекпоинт больше не нужен
+        self.completed = False
         self.profile = config.profiles[config.profile_name]
+        # Пауза и отмена из GUI или по бюджету; on_progress получает снимки статистики не чаще раза в полсекунды
+        self.control = control or RunControl()
+        self.stats = RunStats(on_progress)
+        configure_metrics(self.profile.metrics, self.profile.metrics_port)
+        self.labels = {"profile": config.profile_name, "model": self.profile.model}
         self.model = get_model(config)
+        self.limiter = get_limiter(self.profile.model)
+        # Параметры нативного JSON режима провайдера; пустые - обычный текстовый ответ
+        self.structured = {}
+        if self.profile.structured_output:
+            self.structured = structured_kwargs(
+                AVAILABLE_MODELS[self.profile.model].provider,
+                self.profile.output_columns
+            )
+        # Общий лимит времени на строку берется из настроек браузера профиля
+        self.row_timeout = (self.profile.browser_config or BrowserConfig()).timeout
+        self.cache = None
+        if self.profile.use_cache and LLMCache.enabled_for(self.profile.temperature):
+            self.cache = LLMCache()
+        self.dedup = Deduplicator(
+            lambda item: self._format_prompt(item, self.profile.prompt),
+            self.profile.normalize_rules
+        )
         self.browser_manager = None
+        self.fetcher = None
         if self.profile.use_browser:
-            self.browser_manager = BrowserManager(config)
+            # browser_use и Playwright загружаются только для онлайн профилей
+            from .browser_manager import BrowserManager
+            self.browser_manager = BrowserManager(config, cache=self.cache)
+            if self.profile.tiered_fetch:
+                browser_config = self.profile.browser_config or BrowserConfig()
+                self.fetcher = PageFetcher(timeout=browser_config.navigation_timeout)
+
+    def _format_prompt(self, item: Dict[str, Any], prompt: str) -> str:
+        """Подставляет переменные строки в промпт"""
+        formatted_prompt = prompt
+        for key, value in item.items():
+            formatted_prompt = formatted_prompt.replace(f"{{{key}}}", str(value))
+        return formatted_prompt
+
+    async def _ask_model(self, formatted_prompt: str, structured: bool = False) -> Tuple[str, Usage]:
+        """Отправляет промпт модели с учетом лимитов провайдера.
+
+        structured включает нативный структурированный вывод, если он задан профилем.
+        Возвращает текст ответа и расход вызова.
+        """
+        from langchain.schema import HumanMessage
+
+        kwargs = self.structured if structured else {}
+
+        async def generate():
+            # Задержка считается без ожидания в лимитере и пауз между повторами
+            started = time.monotonic()
+            with METRICS.timer("llm_call", **self.labels):
+                response = await self.model.agenerate(
+                    messages=[[HumanMessage(content=formatted_prompt)]],
+                    **kwargs
+                )
+            self.stats.llm_call(time.monotonic() - started)
+            text = generation_text(response.generations[0][0])
+            usage = response_usage(self.profile.model, response, formatted_prompt, text)
+            METRICS.inc("llm_tokens_total", usage.tokens, **self.labels)
+            self._spend(usage)
+            return text, usage
+
+        return await self.limiter.call(generate, tokens=estimate_tokens(formatted_prompt))
+
+    def _spend(self, usage: Usage):
+        """Учитывает расход вызова; по достижении бюджета профиля новые строки не выдаются"""
+        self.stats.spent(usage.tokens, usage.cost)
+        budget = self.profile.max_cost_usd
+        if budget and self.stats.cost >= budget and not self.control.cancelled:
+            logger.warning(
+                f"Cost budget ${budget:.2f} reached (${self.stats.cost:.4f} spent), "
+                f"finishing rows in progress and stopping"
+            )
+            self.control.cancel()
+
+    def _cached(self, formatted_prompt: str) -> Optional[str]:
+        if not self.cache:
+            return None
+        return self.cache.get(self.profile.model, self.profile.temperature, formatted_prompt)
+
+    def _remember(self, formatted_prompt: str, text: str):
+        if self.cache:
+            self.cache.set(self.profile.model, self.profile.temperature, formatted_prompt, text)
 
     async def process_item_offline(self, item: Dict[str, Any], prompt: str) -> Dict[str, Any]:
         """Обработка одной записи в офлайн режиме (только LLM)"""
+        with METRICS.timer("render_prompt", **self.labels):
+            formatted_prompt = self._format_prompt(item, prompt)
+        return await self._answer_item(item, formatted_prompt)
+
+    async def _answer_item(self, item: Dict[str, Any], formatted_prompt: str,
+                           deadline: Optional[RowDeadline] = None) -> Dict[str, Any]:
+        """Отправляет готовый промпт строки модели и разбирает JSON ответ.
+
+        deadline - общий бюджет строки, если его уже расходуют другие этапы.
+        """
         try:
-            # Подставляем переменные в промпт
-            formatted_prompt = prompt
-            for key, value in item.items():
-                formatted_prompt = formatted_prompt.replace(f"{{{key}}}", str(value))
+            # Отправляем запрос к модели, если такой промпт еще не отвечен
+            cached = self._cached(formatted_prompt)
+            if cached is not None:
+                return {**item, **self._parse_row(cached), **Usage().columns()}
             
-            # Отправляем запрос к модели
-            response = await self.model.agenerate(
-                messages=[[HumanMessage(content=formatted_prompt)]]
-            )
+            deadline = deadline or RowDeadline(self.row_timeout)
+            text, usage = await deadline.run(self._ask_model(formatted_prompt, structured=True))
+            try:
+                result = self._parse_row(text)
+            except ValueError as e:
+                # Переспрашиваем только разбор ответа, а не всю строку
+                logger.info(f"Unparseable answer ({str(e)}), asking for a repair")
+                METRICS.inc("json_repairs_total", **self.labels)
+                text, repair_usage = await deadline.run(self._ask_model(
+                    repair_prompt(text, self.profile.output_columns), structured=True
+                ))
+                usage = usage + repair_usage
+                result = self._parse_row(text)
             
-            # Парсим JSON ответ
-            result = json.loads(response.generations[0][0].text)
-            return {**item, **result}
+            # В кэш попадает уже разобранный ответ
+            self._remember(formatted_prompt, json.dumps(result, ensure_ascii=False))
+            return {**item, **result, **usage.columns()}
             
+        except StageTimeout as e:
+            logger.warning(f"Timeout processing item {item}: {str(e)}")
+            return {**item, STATUS_COLUMN: STATUS_TIMEOUT}
         except Exception as e:
             logger.error(f"Error processing item {item}: {str(e)}")
             return None
 
+    def _parse_row(self, text: str) -> Dict[str, Any]:
+        """Разбирает ответ на одну строку: JSON объект, возможно в обертке из текста"""
+        with METRICS.timer("json_parse", **self.labels):
+            result = extract_json(text)
+        if isinstance(result, list) and len(result) == 1:
+            result = result[0]
+        if not isinstance(result, dict):
+            raise ValueError("Answer is not a JSON object")
+        return result
+
+    def _is_complete(self, result: Optional[Dict[str, Any]]) -> bool:
+        """Ответ содержит все выходные колонки и не завершился таймаутом"""
+        if result is None or result.get(STATUS_COLUMN, STATUS_OK) != STATUS_OK:
+            return False
+        return all(result.get(column) is not None for column in self.profile.output_columns)
+
+    async def process_item_http(self, item: Dict[str, Any], prompt: str,
+                                deadline: RowDeadline) -> Tuple[Optional[Dict[str, Any]], Usage]:
+        """Первый уровень онлайн режима: текст ключевых страниц сайта по HTTP + LLM.
+
+        Загрузка и ответ модели расходуют общий бюджет строки deadline.
+        Возвращает результат и расход уровня; результат None, если сайт требует
+        браузера или ответ неполный, расход тогда переносится в строку браузера.
+        """
+        website = item.get(self.profile.url_column)
+        if not website or not isinstance(website, str):
+            return None, Usage()
+        try:
+            pages = await deadline.run(self.fetcher.fetch_site(website), "http_fetch")
+        except (FetchError, StageTimeout) as e:
+            logger.info(f"HTTP tier skipped, using browser: {str(e)}")
+            return None, Usage()
+        
+        result = await self._answer_item(
+            item,
+            self._format_prompt(item, prompt) + HTTP_TIER_CONTEXT.format(pages=pages),
+            deadline
+        )
+        usage = Usage.from_columns(result or {})
+        if not self._is_complete(result):
+            logger.info(f"Incomplete HTTP tier answer for {website}, using browser")
+            return None, usage
+        return result, usage
+
+    async def process_batch_offline(self, items: List[Dict[str, Any]], prompt: str) -> List[Optional[Dict[str, Any]]]:
+        """Обработка пачки записей одним запросом к модели.
+
+        Строки, которые модель пропустила или вернула в неверном формате,
+        обрабатываются поштучно через process_item_offline.
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+        pending = []
+        for i, item in enumerate(items):
+            cached = self._cached(self._format_prompt(item, prompt))
+            if cached is not None:
+                try:
+                    results[i] = {**item, **self._parse_row(cached), **Usage().columns()}
+                    continue
+                except ValueError:
+                    pass
+            pending.append(i)
+
+        if len(pending) > 1:
+            usage = Usage()
+            row_ids = [str(i) for i in pending]
+            batch_prompt = build_batch_prompt(prompt, [(str(i), items[i]) for i in pending])
+            try:
+                # На пачку дается суммарный бюджет ее строк; при таймауте строки уйдут поштучно
+                text, usage = await RowDeadline(self.row_timeout * len(pending)).run(self._ask_model(batch_prompt))
+                answers = split_batch_response(text, row_ids)
+            except Exception as e:
+                logger.warning(f"Malformed batch response, falling back to single rows: {str(e)}")
+                answers = {}
+            # Расход пачки делится поровну между строками, получившими ответ
+            share = usage.share(len(answers)) if answers else Usage()
+            for i in pending:
+                answer = answers.get(str(i))
+                if answer is not None:
+                    # Ответ на строку кэшируется так же, как при одиночном запросе
+                    self._remember(
+                        self._format_prompt(items[i], prompt),
+                        json.dumps(answer, ensure_ascii=False)
+                    )
+                    results[i] = {**items[i], **answer, **share.columns()}
+            pending = [i for i in pending if results[i] is None]
+
+        # Поштучно и по очереди: пачка занимает один слот планировщика,
+        # и запасной путь не должен умножать параллелизм на размер пачки
+        for i in pending:
+            results[i] = await self.process_item_offline(items[i], prompt)
+        return results
+
+    def _worker_count(self) -> int:
+        """Число одновременно обрабатываемых единиц работы"""
+        if self.profile.use_browser:
+            return (self.profile.browser_config or BrowserConfig()).max_parallel
+        return self.profile.max_workers
+
+    def _batch_size(self) -> int:
+        """Размер пачки строк в одном запросе (только офлайн режим)"""
+        if self.profile.use_browser:
+            return 1
+        return max(1, self.profile.batch_size)
+
+    async def _process_unit(self, tasks: List["RowTask"], worker_id: int) -> List[Optional[Dict[str, Any]]]:
+        """Обрабатывает единицу работы (одну строку или пачку строк)"""
+        self.stats.dispatched(len(tasks))
+        if self.profile.use_browser:
+            return [await self._process_online(task.item) for task in tasks]
+        if len(tasks) == 1:
+            return [await self.process_item_offline(tasks[0].item, self.profile.prompt)]
+        return await self.process_batch_offline([task.item for task in tasks], self.profile.prompt)
+
+    async def _process_online(self, item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Онлайн режим: сначала HTTP уровень (если включен), затем агент в браузере.
+
+        Оба уровня расходуют один бюджет строки BrowserConfig.timeout.
+        """
+        deadline = None
+        http_usage = Usage()
+        if self.fetcher:
+            deadline = self.browser_manager.new_deadline()
+            with METRICS.timer("http_tier", **self.labels):
+                result, http_usage = await self.process_item_http(item, self.profile.prompt, deadline)
+            if result is not None:
+                return {**result, TIER_COLUMN: "http"}
+        started = time.monotonic()
+        result = await self.browser_manager.process_item(item, self.profile.prompt, deadline)
+        self.stats.page(time.monotonic() - started)
+        if result is not None:
+            # Расход агента браузер возвращает в колонках строки; вызов HTTP уровня
+            # уже учтен в бюджете, но в колонках строки складывается с агентом
+            usage = Usage.from_columns(result)
+            self._spend(usage)
+            result.update((usage + http_usage).columns())
+        METRICS.observe("browser_row", time.monotonic() - started, **self.labels)
+        if result is not None and self.fetcher:
+            result[TIER_COLUMN] = "browser"
+        return result
+
+    def _run_key(self) -> str:
+        """Параметры запуска, от которых зависит результат строки"""
+        return json.dumps([
+            self.profile.prompt,
+            self.profile.output_columns,
+            self.profile.model,
+            self.profile.temperature,
+            self.profile.use_browser,
+            self.profile.tiered_fetch
+        ], ensure_ascii=False)
+
+    def _load_input(self) -> InputReader:
+        """Открывает входной файл на потоковое чтение и проверяет колонки по заголовку"""
+        reader = open_reader(self.config.input_file)
+        reader.validate(self.profile.input_columns)
+        return reader
+
+    def _set_total(self, reader: InputReader, done: Set[str]):
+        """Число строк к обработке, если формат позволяет узнать его без чтения файла"""
+        count = reader.row_count()
+        self.stats.total = max(0, count - len(done)) if count is not None else None
+
+    def _open_store(self) -> Tuple[CheckpointStore, Set[str]]:
+        """Открывает sidecar-хранилище и возвращает отпечатки готовых строк"""
+        store = CheckpointStore.for_output(self.config.output_file, self._run_key())
+        done = store.completed() if self.resume else set()
+        if done:
+            logger.info(f"Resuming: {len(done)} rows already processed")
+        store.open(resume=self.resume)
+        return store, done
+
+    def _pending_rows(self, reader: InputReader, store: CheckpointStore, done: Set[str],
+                      positions: Dict[str, int]) -> Iterator[RowTask]:
+        """Отдает необработанные строки по мере чтения файла, запоминая позицию каждой"""
+        for idx, item in enumerate(reader.rows()):
+            fingerprint = store.fingerprint(item)
+            positions[fingerprint] = idx
+            if fingerprint not in done:
+                yield RowTask(idx, fingerprint, item)
+
+    def _deduplicated(self, rows: Iterator[RowTask], store: CheckpointStore) -> Iterator[RowTask]:
+        """Нормализует строки и отдает на обработку только уникальные промпты.
+
+        Дубликаты либо сразу получают готовый ответ, либо ждут ответа лидера группы.
+        """
+        for task in rows:
+            self.dedup.rows += 1
+            task.original = task.item
+            task.item = normalize_item(task.item, self.dedup.rules)
+            task.key = self.dedup.key(task.item)
+            
+            finished = self.dedup.finished_result(task.key)
+            if finished is not None:
+                self.dedup.saved += 1
+                store.append(task.fingerprint, task.idx, {**finished, **task.original, **Usage().columns()})
+                self.stats.recorded(1, ok=True, dispatched=False)
+                continue
+            leader = self.dedup.inflight.get(task.key)
+            if leader is not None:
+                self.dedup.saved += 1
+                leader.followers.append(task)
+                continue
+            self.dedup.inflight[task.key] = task
+            yield task
+
+    def _record(self, task: RowTask, result: Optional[Dict[str, Any]], store: CheckpointStore):
+        """Записывает ответ лидера группы для него самого и всех его дубликатов"""
+        self.dedup.inflight.pop(task.key, None)
+        if result is None:
+            self.stats.recorded(1 + len(task.followers), ok=False)
+            METRICS.inc("rows_total", 1 + len(task.followers), status="error", **self.labels)
+            return
+        result.setdefault(STATUS_COLUMN, STATUS_OK)
+        if result[STATUS_COLUMN] == STATUS_OK:
+            self.dedup.remember(task.key, result, task.item)
+        for row in [task, *task.followers]:
+            # Входные колонки выводим в исходном, не нормализованном виде
+            store.append(row.fingerprint, row.idx, {**result, **(row.original or row.item)})
+            # Расход относится только к строке, которая реально отправлялась модели
+            result = {**result, **Usage().columns()}
+        self.stats.recorded(1 + len(task.followers), ok=result[STATUS_COLUMN] == STATUS_OK)
+        METRICS.inc("rows_total", 1 + len(task.followers), status=result[STATUS_COLUMN], **self.labels)
+
+    def _sidecar_path(self, suffix: str) -> Path:
+        output_file = self.config.output_file
+        return output_file.with_name(output_file.name + suffix)
+
     async def process_data(self):
         """Основной метод обработки данных"""
-        # Загружаем входные данные
-        df = pd.read_excel(self.config.input_file) if self.config.input_file.suffix == '.xlsx' \
-            else pd.read_csv(self.config.input_file)
+        if self.profile.job_queue:
+            return await self.process_data_queue()
+        if self.profile.batch_backend and not self.profile.use_browser:
+            return await self.process_data_batch_job()
+
+        reader = self._load_input()
         
-        # Проверяем наличие необходимых колонок
-        missing_columns = [col for col in self.profile.input_columns if col not in df.columns]
-        if missing_columns:
-            raise ValueError(f"Missing required columns: {', '.join(missing_columns)}")
+        # Результаты пишутся в sidecar-файл по мере готовности каждой строки
+        store, done = self._open_store()
+        self._set_total(reader, done)
+
+        # Текущая позиция каждой строки, чтобы собрать результат в исходном порядке
+        positions: Dict[str, int] = {}
+
+        def on_result(tasks: List[RowTask], results):
+            for task, result in zip(tasks, results or [None] * len(tasks)):
+                self._record(task, result, store)
+
+        # Обрабатываем записи: строки читаются лениво, дубликаты отсеиваются,
+        # уникальные промпты попадают в ограниченную очередь
+        scheduler = BoundedScheduler(max_workers=self._worker_count(), control=self.control)
+        rows = self._deduplicated(self._pending_rows(reader, store, done, positions), store)
+        units = chunked(rows, self._batch_size())
+        try:
+            await scheduler.run(units, self._process_unit, on_result)
+        finally:
+            store.close()
         
-        # Обрабатываем записи
-        tasks = []
-        for idx, row in df.iterrows():
-            if self.profile.use_browser:
-                # Онлайн режим с браузером
-                controller_idx = idx % self.profile.browser_config.max_parallel
-                tasks.append(
-                    self.browser_manager.process_item(
-                        row.to_dict(),
-                        self.profile.prompt,
-                        controller_idx
-                    )
+        self._save_results(reader.columns(), store, positions)
+
+    async def process_data_batch_job(self, backend: Optional[BatchBackend] = None):
+        """Пакетный режим: все промпты профиля уходят одним заданием в batch API провайдера.
+
+        Идентификатор отправленного задания сохраняется рядом с выходным файлом,
+        поэтому перезапуск (в том числе после отмены) продолжает ожидать то же
+        задание, а не создает новое.
+        """
+        backend = backend or get_batch_backend(self.profile.batch_backend, self.config)
+        reader = self._load_input()
+        store, done = self._open_store()
+        self._set_total(reader, done)
+        positions: Dict[str, int] = {}
+        requests_path = self._sidecar_path(".batch_requests.jsonl")
+        state_path = self._sidecar_path(".batch_job.json")
+        model_id = AVAILABLE_MODELS[self.profile.model].params["model"]
+
+        # Строки, ответ на которые уже есть в кэше, в задание не попадают
+        tasks: Dict[str, RowTask] = {}
+
+        def batch_requests():
+            rows = self._deduplicated(self._pending_rows(reader, store, done, positions), store)
+            for task in rows:
+                formatted_prompt = self._format_prompt(task.item, self.profile.prompt)
+                cached = self._cached(formatted_prompt)
+                if cached is not None:
+                    self._record(task, {**task.item, **self._parse_row(cached)}, store)
+                    continue
+                # Отпечаток не зависит от порядка строк во входном файле;
+                # двоеточие заменяем: custom_id Anthropic - только [a-zA-Z0-9_-]
+                custom_id = task.fingerprint.replace(":", "-")
+                tasks[custom_id] = task
+                yield {
+                    "custom_id": custom_id,
+                    "model": model_id,
+                    "temperature": self.profile.temperature,
+                    "prompt": formatted_prompt
+                }
+
+        try:
+            count = write_jsonl(requests_path, batch_requests())
+            if count:
+                if state_path.exists():
+                    with open(state_path, 'r', encoding='utf-8') as f:
+                        job_id = json.load(f)["job_id"]
+                    logger.info(f"Continuing batch job {job_id}")
+                else:
+                    job_id = await backend.submit(requests_path)
+                    with open(state_path, 'w', encoding='utf-8') as f:
+                        json.dump({"job_id": job_id, "backend": self.profile.batch_backend}, f)
+                    logger.info(f"Submitted batch job {job_id} with {count} requests")
+
+                state = await backend.wait(
+                    job_id, self.profile.batch_poll_interval, lambda: self.control.cancelled
                 )
+                if self.control.cancelled:
+                    # .batch_job.json остается: следующий запуск дождется того же задания
+                    logger.info(f"Stopped waiting for batch job {job_id}, it will be resumed on the next run")
+                    return
+                if state != COMPLETED:
+                    state_path.unlink()
+                    raise RuntimeError(f"Batch job {job_id} finished with status {state}")
+
+                # Сливаем ответы задания с исходными строками
+                for custom_id, text in (await backend.results(job_id)).items():
+                    task = tasks.get(custom_id)
+                    if task is None:
+                        continue
+                    try:
+                        result = self._parse_row(text)
+                    except ValueError as e:
+                        logger.error(f"Error parsing batch result for {custom_id}: {str(e)}")
+                        continue
+                    self._remember(self._format_prompt(task.item, self.profile.prompt), text)
+                    self._record(task, {**task.item, **result}, store)
+                await backend.cleanup(job_id)
+                state_path.unlink()
+        finally:
+            store.close()
+            if requests_path.exists():
+                requests_path.unlink()
+
+        self._save_results(reader.columns(), store, positions)
+
+    def _job_name(self) -> str:
+        """Имя задания в очереди; воркеры с тем же config.json вычисляют то же имя"""
+        digest = hashlib.sha1((self._run_key() + str(self.config.output_file.name)).encode("utf-8"))
+        return f"job-{digest.hexdigest()[:16]}"
+
+    async def process_data_queue(self, queue: Optional[JobQueue] = None):
+        """Координатор распределенного режима: строки уходят в очередь, их обрабатывают воркеры.
+
+        Координатор только ставит задачи и собирает результаты в sidecar-хранилище,
+        воркеры запускаются отдельно (python -m src.cli --worker) на любых машинах.
+        """
+        queue = queue or get_job_queue(self.profile.job_queue)
+        job = self._job_name()
+        reader = self._load_input()
+        store, done = self._open_store()
+        self._set_total(reader, done)
+        positions: Dict[str, int] = {}
+        tasks: Dict[str, RowTask] = {}
+
+        def queue_tasks():
+            for task in self._deduplicated(self._pending_rows(reader, store, done, positions), store):
+                tasks[task.fingerprint] = task
+                yield task.fingerprint, {"idx": task.idx, "item": task.item}
+
+        try:
+            added = queue.put(job, queue_tasks())
+            logger.info(f"Job {job}: {added} new rows queued, {len(tasks)} rows pending")
+            while tasks and not self.control.cancelled:
+                for task_id, result in queue.take_results(job).items():
+                    task = tasks.pop(task_id, None)
+                    if task is not None:
+                        # Бюджет считается по всем воркерам: каждый видит только свой расход
+                        if result is not None:
+                            self._spend(Usage.from_columns(result))
+                        self._record(task, result, store)
+                if tasks and not self.control.cancelled:
+                    logger.info(f"Job {job}: waiting for {len(tasks)} rows")
+                    await asyncio.sleep(QUEUE_POLL_INTERVAL)
+            if tasks:
+                # Воркеры больше не арендуют строки; при resume они снова попадут в очередь
+                removed = queue.cancel(job)
+                logger.info(f"Job {job} cancelled, {removed} queued rows removed")
+        finally:
+            store.close()
+            queue.close()
+
+        self._save_results(reader.columns(), store, positions)
+
+    async def serve_queue(self, queue: Optional[JobQueue] = None, job: Optional[str] = None,
+                          keep_running: bool = False) -> int:
+        """Воркер распределенного режима: арендует строки задания и обрабатывает их.
+
+        Строки идут обычным офлайн или браузерным путем. Без keep_running воркер
+        завершается, когда в задании не остается необработанных строк.
+        Возвращает число обработанных единиц работы.
+        """
+        queue = queue or get_job_queue(self.profile.job_queue)
+        job = job or self._job_name()
+        batch_size = self._batch_size()
+        # Аренда покрывает время ожидания в очереди планировщика и обработку пачки
+        visibility = self.profile.lease_timeout
+
+        async def leased_units():
+            while True:
+                leased = queue.lease(job, batch_size, visibility)
+                if leased:
+                    yield leased
+                elif self.control.cancelled:
+                    return
+                elif not keep_running and queue.unfinished(job) == 0:
+                    return
+                else:
+                    await asyncio.sleep(QUEUE_POLL_INTERVAL)
+
+        async def handle(leased, worker_id: int):
+            tasks = [RowTask(task.payload["idx"], task.id, task.payload["item"]) for task in leased]
+            return await self._process_unit(tasks, worker_id)
+
+        def on_result(leased, results):
+            for task, result in zip(leased, results or [None] * len(leased)):
+                queue.complete(task, result)
+
+        logger.info(f"Serving job {job} from {self.profile.job_queue}")
+        scheduler = BoundedScheduler(max_workers=self._worker_count(), queue_size=1, control=self.control)
+        try:
+            return await scheduler.run(leased_units(), handle, on_result)
+        finally:
+            queue.close()
+
+    def _save_results(self, input_columns: List[str], store: CheckpointStore, positions: Dict[str, int]):
+        """Собирает итоговый файл из sidecar-хранилища в исходном порядке строк"""
+        # Последняя запись строки побеждает: повтор после таймаута перекрывает старую.
+        # В памяти только смещения записей, сами результаты читаются по одной при записи
+        latest: Dict[int, int] = {}
+        for offset, record in store.offsets():
+            idx = positions.get(record["fingerprint"])
+            if idx is not None:
+                latest[idx] = offset
+        if latest:
+            # Оставляем только нужные колонки в нужном порядке
+            all_columns = input_columns + self.profile.output_columns + [STATUS_COLUMN] + USAGE_COLUMNS
+            if self.fetcher:
+                all_columns.append(TIER_COLUMN)
+            path = output_path(self.config.output_file, self.profile.output_format)
+            succeeded = 0
+            with METRICS.timer("save_output", **self.labels), open_writer(path, all_columns) as writer:
+                for record in store.records_at(latest[idx] for idx in sorted(latest)):
+                    writer.write(record["result"])
+                    succeeded += record["result"].get(STATUS_COLUMN, STATUS_OK) == STATUS_OK
+            logger.info(f"Results saved to {path}")
+            # После отмены вход прочитан не целиком и positions знает не все строки
+            self.completed = succeeded == len(positions) and not self.control.cancelled
+            if self.completed:
+                if not self.keep_checkpoint:
+                    store.remove()
             else:
-                # Офлайн режим только с LLM
-                tasks.append(
-                    self.process_item_offline(
-                        row.to_dict(),
-                        self.profile.prompt
-                    )
+                logger.warning(
+                    f"{len(positions) - succeeded} rows failed or timed out, "
+                    f"checkpoint kept at {store.path} for resume"
                 )
-        
-        results = await asyncio.gather(*tasks)
-        results = [r for r in results if r is not None]
-        
-        # Сохраняем результаты
-        if results:
-            output_df = pd.DataFrame(results)
-            # Оставляем только нужные колонки в нужном порядке
-            all_columns = df.columns.tolist() + self.profile.output_columns
-            output_df = output_df[all_columns]
-            output_df.to_excel(self.config.output_file, index=False)
-            logger.info(f"Results saved to {self.config.output_file}")
         else:
             logger.warning("No results to save")
 
+        logger.info(self.dedup.report())
+        if self.cache:
+            logger.info(self.cache.stats())
+        for name, stats in pool_stats().items():
+            logger.info(f"HTTP pool {name}: {stats}")
+        logger.info(f"Run usage: {self.stats.tokens} tokens, ${self.stats.cost:.4f}")
+        self.stats.publish(force=True)
+        METRICS.write_summary(self._sidecar_path(".metrics.json"))
+
     async def cleanup(self):
         """Очистка ресурсов"""
         if self.browser_manager:
-            await self.browser_manager.cleanup() 
\ No newline at end of file
+            await self.browser_manager.cleanup()
+        if self.cache:
+            self.cache.close()
+        METRICS.shutdown()
+        await close_model_clients() 
\ No newline at end of file
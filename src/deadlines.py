@@ -0,0 +1,138 @@
+import asyncio
+import time
+from contextlib import contextmanager, suppress
+from contextvars import ContextVar
+from typing import Any, Awaitable, Iterator, Optional
+
+# Дедлайн строки, внутри которого выполняется текущий код; лимитер ставит его часы на паузу
+_current: ContextVar[Optional["RowDeadline"]] = ContextVar("row_deadline", default=None)
+
+
+class StageTimeout(Exception):
+    """Строка не уложилась в бюджет времени этапа"""
+
+    def __init__(self, stage: str, budget: float):
+        super().__init__(f"{stage} timed out after {budget:.1f}s")
+        self.stage = stage
+        self.budget = budget
+
+
+@contextmanager
+def paused_deadline() -> Iterator[None]:
+    """Время внутри блока не расходует бюджет текущей строки.
+
+    Так лимитер исключает ожидание места в бакете, паузы Retry-After
+    и задержки между повторами: под 429 строка ждет, а не уходит в timeout.
+    """
+    deadline = _current.get()
+    if deadline is None:
+        yield
+        return
+    deadline._pause()
+    try:
+        yield
+    finally:
+        deadline._resume()
+
+
+class RowDeadline:
+    """Бюджеты времени одной строки: навигация, шаг агента и общий лимит.
+
+    Общий лимит отсчитывается с момента создания; бюджет этапа никогда
+    не превышает остатка общего лимита. Время ожидания лимитера в бюджеты
+    не входит.
+    """
+
+    def __init__(self, total: float, navigation: Optional[float] = None, step: Optional[float] = None):
+        self.total = total
+        self.navigation = navigation
+        self.step = step
+        self.started = time.monotonic()
+        self._excluded = 0.0
+        self._pauses = 0
+        self._paused_at = 0.0
+
+    def _pause(self):
+        if self._pauses == 0:
+            self._paused_at = time.monotonic()
+        self._pauses += 1
+
+    def _resume(self):
+        self._pauses -= 1
+        if self._pauses == 0:
+            self._excluded += time.monotonic() - self._paused_at
+
+    def exclude(self, seconds: float):
+        """Не засчитывает в бюджет уже прошедшее ожидание, например свободного браузера"""
+        self._excluded += seconds
+
+    def _excluded_now(self) -> float:
+        if self._pauses:
+            return self._excluded + time.monotonic() - self._paused_at
+        return self._excluded
+
+    def _spent(self, since: float, excluded_before: float) -> float:
+        return time.monotonic() - since - (self._excluded_now() - excluded_before)
+
+    def remaining(self) -> float:
+        return self.total - self._spent(self.started, 0.0)
+
+    async def run(self, awaitable: Awaitable[Any], stage: str = "total", budget: Optional[float] = None) -> Any:
+        """Выполняет этап в пределах его бюджета и остатка общего лимита"""
+        started, excluded = time.monotonic(), self._excluded_now()
+
+        def limit() -> float:
+            left = self.remaining()
+            if budget is not None:
+                left = min(left, budget - self._spent(started, excluded))
+            return left
+
+        if limit() <= 0:
+            if asyncio.iscoroutine(awaitable):
+                awaitable.close()
+            raise StageTimeout(stage, budget or self.total)
+
+        # Задача копирует контекст в момент создания и видит этот дедлайн
+        token = _current.set(self)
+        try:
+            task = asyncio.ensure_future(awaitable)
+        finally:
+            _current.reset(token)
+
+        try:
+            # Пока часы на паузе, limit() не убывает и ожидание продлевается
+            while (left := limit()) > 0:
+                done, _ = await asyncio.wait({task}, timeout=left)
+                if done:
+                    return task.result()
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+        task.cancel()
+        with suppress(asyncio.CancelledError, Exception):
+            await task
+
+        # Общий лимит исчерпан раньше бюджета этапа
+        if budget is None or self.remaining() <= 0:
+            raise StageTimeout("total", self.total)
+        raise StageTimeout(stage, budget)
+
+    def bound_agent_steps(self, agent: Any):
+        """Ограничивает каждый шаг агента browser_use.
+
+        Первый шаг открывает сайт и получает бюджет навигации,
+        остальные - бюджет шага агента.
+        """
+        step = getattr(agent, "step", None)
+        if step is None:
+            return
+        calls = 0
+
+        async def bounded_step(*args, **kwargs):
+            nonlocal calls
+            calls += 1
+            if calls == 1 and self.navigation:
+                return await self.run(step(*args, **kwargs), "navigation", self.navigation)
+            return await self.run(step(*args, **kwargs), "agent_step", self.step)
+
+        agent.step = bounded_step
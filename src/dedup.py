@@ -0,0 +1,117 @@
+import hashlib
+import re
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# Суффиксы второго уровня, под которыми регистрируются домены (co.uk, com.br, ...)
+MULTI_PART_SUFFIXES = {
+    "co.uk", "org.uk", "ac.uk", "gov.uk", "me.uk", "ltd.uk", "plc.uk",
+    "com.br", "net.br", "org.br", "com.ar", "net.ar", "org.ar", "com.mx", "org.mx",
+    "com.au", "net.au", "org.au", "co.nz", "org.nz", "co.za", "org.za",
+    "co.jp", "ne.jp", "or.jp", "co.kr", "or.kr", "co.in", "net.in", "org.in",
+    "com.cn", "net.cn", "org.cn", "com.hk", "com.sg", "com.tw", "com.tr",
+    "com.ua", "org.ua", "co.il", "org.il", "com.co", "com.pe", "com.cl", "com.uy",
+    "com.ve", "com.ec", "com.py", "com.bo", "com.pl", "com.ru", "org.ru", "msk.ru", "spb.ru"
+}
+
+# Параметры ссылок, которые не меняют страницу
+TRACKING_PARAMS = re.compile(r"^(utm_.*|gclid|fbclid|yclid|msclkid|mc_cid|mc_eid|ref|ref_src|_ga)$", re.IGNORECASE)
+
+
+def _split_url(value: str):
+    value = value.strip()
+    if not re.match(r"^[a-z][a-z0-9+.-]*://", value, re.IGNORECASE):
+        value = "http://" + value
+    return urlsplit(value)
+
+
+def _host(parts) -> str:
+    host = (parts.hostname or "").lower().rstrip(".")
+    return host[4:] if host.startswith("www.") else host
+
+
+def registrable_domain(value: str) -> str:
+    """Регистрируемый домен: https://www.shop.example.co.uk/a?utm_source=x -> example.co.uk"""
+    host = _host(_split_url(value))
+    labels = host.split(".")
+    if len(labels) <= 2 or re.match(r"^[\d.]+$", host):
+        return host
+    if ".".join(labels[-2:]) in MULTI_PART_SUFFIXES:
+        return ".".join(labels[-3:])
+    return ".".join(labels[-2:])
+
+
+def canonical_url(value: str) -> str:
+    """Адрес без схемы, www, порта по умолчанию, завершающего слэша и трекинговых параметров"""
+    parts = _split_url(value)
+    host = _host(parts)
+    if parts.port and parts.port not in (80, 443):
+        host = f"{host}:{parts.port}"
+    query = urlencode([
+        (key, val) for key, val in parse_qsl(parts.query, keep_blank_values=True)
+        if not TRACKING_PARAMS.match(key)
+    ])
+    return urlunsplit(("", host, parts.path.rstrip("/"), query, "")).lstrip("/")
+
+
+NORMALIZERS: Dict[str, Callable[[str], str]] = {
+    "domain": registrable_domain,
+    "url": canonical_url,
+    "lower": lambda value: value.strip().lower(),
+    "strip": lambda value: " ".join(value.split())
+}
+
+
+def normalize_item(item: Dict[str, Any], rules: Dict[str, str]) -> Dict[str, Any]:
+    """Применяет правила нормализации профиля к колонкам строки"""
+    if not rules:
+        return item
+    normalized = dict(item)
+    for column, rule in rules.items():
+        value = normalized.get(column)
+        if isinstance(value, str) and value.strip():
+            if rule not in NORMALIZERS:
+                raise ValueError(f"Unknown normalization rule '{rule}' for column '{column}'")
+            normalized[column] = NORMALIZERS[rule](value)
+    return normalized
+
+
+class Deduplicator:
+    """Группирует строки с одинаковым итоговым промптом.
+
+    Первая строка группы (лидер) уходит на обработку, остальные ждут ее
+    результата. Последние max_finished ответов групп хранятся по хешу промпта
+    (LRU), поэтому поздние дубликаты получают ответ без обращения к модели,
+    а память не растет с размером входа. Вытесненный дубликат идет обычным
+    путем и при temperature == 0 обычно попадает в дисковый кэш LLM.
+    """
+
+    def __init__(self, render: Callable[[Dict[str, Any]], str], rules: Dict[str, str],
+                 max_finished: int = 10_000):
+        self.render = render
+        self.rules = rules or {}
+        self.max_finished = max_finished
+        self.finished: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.inflight: Dict[str, Any] = {}
+        self.rows = 0
+        self.saved = 0
+
+    def key(self, normalized: Dict[str, Any]) -> str:
+        return hashlib.sha1(self.render(normalized).encode("utf-8")).hexdigest()
+
+    def finished_result(self, key: str) -> Optional[Dict[str, Any]]:
+        result = self.finished.get(key)
+        if result is not None:
+            self.finished.move_to_end(key)
+        return result
+
+    def remember(self, key: str, result: Dict[str, Any], item: Dict[str, Any]):
+        """Сохраняет ответ группы без входных колонок"""
+        self.finished[key] = {k: v for k, v in result.items() if k not in item}
+        self.finished.move_to_end(key)
+        while len(self.finished) > self.max_finished:
+            self.finished.popitem(last=False)
+
+    def report(self) -> str:
+        return f"Deduplication: {self.saved} of {self.rows} rows served without a new call"
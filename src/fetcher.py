@@ -0,0 +1,157 @@
+import asyncio
+import logging
+import re
+from dataclasses import dataclass, field
+from html.parser import HTMLParser
+from typing import List, Optional, Tuple
+from urllib.parse import urljoin, urlparse
+
+import httpx
+
+from .http_pool import get_http_client
+
+logger = logging.getLogger(__name__)
+
+HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+        "(KHTML, like Gecko) Chrome/124.0 Safari/537.36"
+    ),
+    "Accept": "text/html,application/xhtml+xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.8"
+}
+
+# Страницы, где обычно есть сведения о компании, ее офисах и контактах
+KEY_PAGE_WORDS = (
+    "about", "company", "contact", "locations", "offices", "global", "international",
+    "о-компании", "about-us", "kontakty", "contacts", "empresa", "contato", "contacto"
+)
+
+# Теги, текст которых не несет содержимого страницы
+SKIP_TAGS = {"script", "style", "noscript", "template", "svg", "iframe", "head"}
+BLOCK_TAGS = {"p", "div", "section", "article", "li", "br", "h1", "h2", "h3", "h4", "tr", "footer", "header"}
+
+JS_MARKERS = ("enable javascript", "javascript is required", "please turn on javascript")
+BLOCK_MARKERS = ("captcha", "access denied", "attention required", "are you a robot")
+
+
+class FetchError(Exception):
+    """Сайт нельзя обработать без браузера: блокировка, JS-приложение или сетевая ошибка"""
+
+
+class TextExtractor(HTMLParser):
+    """Извлекает видимый текст и ссылки страницы в духе readability"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self.links: List[Tuple[str, str]] = []
+        self._skip = 0
+        self._href: Optional[str] = None
+        self._link_text: List[str] = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self._skip += 1
+        elif tag in BLOCK_TAGS:
+            self.parts.append("\n")
+        if tag == "a":
+            self.parts.append(" ")
+            self._href = dict(attrs).get("href")
+            self._link_text = []
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS and self._skip:
+            self._skip -= 1
+        elif tag == "a" and self._href:
+            self.links.append((self._href, " ".join(self._link_text).strip()))
+            self._href = None
+
+    def handle_data(self, data):
+        if self._skip:
+            return
+        self.parts.append(data)
+        if self._href is not None:
+            self._link_text.append(data.strip())
+
+    def text(self) -> str:
+        text = re.sub(r"[ \t\r\f\v]+", " ", "".join(self.parts))
+        lines = [line.strip() for line in text.split("\n")]
+        return "\n".join(line for line in lines if line)
+
+
+@dataclass
+class FetchedPage:
+    url: str
+    text: str
+    links: List[Tuple[str, str]] = field(default_factory=list)
+
+
+def normalize_url(website: str) -> str:
+    website = website.strip()
+    if not re.match(r"^https?://", website, re.IGNORECASE):
+        website = "https://" + website
+    return website
+
+
+class PageFetcher:
+    """Легкий HTTP-уровень: главная страница и ключевые страницы сайта без браузера"""
+
+    def __init__(self, timeout: float = 15, max_pages: int = 3, max_chars: int = 6000, min_chars: int = 300):
+        self.timeout = timeout
+        self.max_pages = max_pages
+        self.max_chars = max_chars
+        self.min_chars = min_chars
+
+    async def fetch(self, url: str) -> FetchedPage:
+        client = get_http_client("fetcher")
+        try:
+            response = await client.get(url, headers=HEADERS, follow_redirects=True, timeout=self.timeout)
+        except httpx.HTTPError as e:
+            raise FetchError(f"{url}: {type(e).__name__}")
+        if response.status_code in (401, 403, 429, 503):
+            raise FetchError(f"{url}: blocked with HTTP {response.status_code}")
+        if response.status_code >= 400:
+            raise FetchError(f"{url}: HTTP {response.status_code}")
+        if "html" not in response.headers.get("content-type", "html"):
+            raise FetchError(f"{url}: not an HTML page")
+
+        extractor = TextExtractor()
+        extractor.feed(response.text)
+        return FetchedPage(str(response.url), extractor.text(), extractor.links)
+
+    def _key_pages(self, page: FetchedPage) -> List[str]:
+        """Ссылки того же сайта на страницы about/contact/locations"""
+        host = urlparse(page.url).netloc
+        found = []
+        for href, text in page.links:
+            url = urljoin(page.url, href).split("#")[0]
+            if urlparse(url).netloc != host or url.rstrip("/") == page.url.rstrip("/"):
+                continue
+            haystack = f"{urlparse(url).path} {text}".lower()
+            if any(word in haystack for word in KEY_PAGE_WORDS) and url not in found:
+                found.append(url)
+        return found[:self.max_pages - 1]
+
+    async def fetch_site(self, website: str) -> str:
+        """Собирает текст ключевых страниц сайта для офлайн промпта.
+
+        Бросает FetchError, если сайт требует браузера.
+        """
+        home = await self.fetch(normalize_url(website))
+        lowered = home.text.lower()
+        if any(marker in lowered for marker in BLOCK_MARKERS) and len(home.text) < 2000:
+            raise FetchError(f"{home.url}: bot protection page")
+        if len(home.text) < self.min_chars or any(marker in lowered for marker in JS_MARKERS):
+            raise FetchError(f"{home.url}: page needs JavaScript")
+
+        pages = [home]
+        extra = await asyncio.gather(
+            *[self.fetch(url) for url in self._key_pages(home)],
+            return_exceptions=True
+        )
+        pages.extend(page for page in extra if isinstance(page, FetchedPage))
+
+        # Делим лимит текста поровну между страницами
+        budget = self.max_chars // len(pages)
+        return "\n\n".join(f"=== {page.url} ===\n{page.text[:budget]}" for page in pages)
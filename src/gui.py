@@ -2,19 +2,33 @@ import customtkinter as ctk
 import json
 from pathlib import Path
 import asyncio
+import queue
+import threading
 import webbrowser
 import os
 from typing import Optional, Dict, Any
 from .data_processor import DataProcessor
-from .config import Config
+from .config_store import get_config_store
+from .run_control import RunControl
+from .run_stats import StatsSnapshot
+from .sharding import ShardedRunner
 from .models import AVAILABLE_MODELS
 from .widgets import LabelWithTooltip, CheckboxWithTooltip, BetterTextbox
 from .localization import Localization
 import tkinter as tk
 
+def format_duration(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return "—"
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
 class BrowserAssistantGUI:
     def __init__(self):
         self.config: Optional[Dict[str, Any]] = None
+        # Конфигурация читается один раз и перечитывается только при изменении файла
+        self.config_store = get_config_store()
         self.localization = Localization.load()
         self.localization.update_translations()  # Обновляем переводы
         self.localization.current_language = "en"  # Английский по умолчанию
@@ -270,7 +284,31 @@ class BrowserAssistantGUI:
         )
         self.pause_button.pack(side="left", padx=5)
         
+        # Кнопка остановки: готовые строки сохраняются, запуск можно продолжить позже
+        self.stop_button = ctk.CTkButton(
+            self.button_frame,
+            text=self.localization.get("stop_button"),  # ⏹️ Stop
+            command=self.stop_process,
+            state="disabled"
+        )
+        self.stop_button.pack(side="left", padx=5)
+        
+        # Строка состояния текущего запуска
+        self.status_label = ctk.CTkLabel(self.button_frame, text="")
+        self.status_label.pack(side="left", padx=10)
+        
+        # Живая панель: скорость, задержки, стоимость и ETA текущего запуска
+        self.stats_frame = ctk.CTkFrame(self.main_frame)
+        self.stats_frame.pack(fill="x", pady=(0, 10))
+        self.stats_label = ctk.CTkLabel(self.stats_frame, text="", justify="left", anchor="w")
+        self.stats_label.pack(fill="x", padx=10, pady=5)
+        
         self.is_paused = False
+        # Обработка идет в фоновом потоке со своим циклом событий,
+        # события в поток Tk передаются через очередь
+        self.control: Optional[RunControl] = None
+        self.worker_thread: Optional[threading.Thread] = None
+        self.events: queue.Queue = queue.Queue()
 
         self.load_profiles()
 
@@ -288,7 +326,7 @@ class BrowserAssistantGUI:
 
     def browse_input(self):
         filename = ctk.filedialog.askopenfilename(
-            filetypes=[("Excel files", "*.xlsx"), ("CSV files", "*.csv")]
+            filetypes=[("Excel files", "*.xlsx"), ("CSV files", "*.csv"), ("JSON Lines", "*.jsonl"), ("Parquet files", "*.parquet")]
         )
         if filename:
             self.input_file.delete(0, "end")
@@ -297,7 +335,7 @@ class BrowserAssistantGUI:
     def browse_output(self):
         filename = ctk.filedialog.asksaveasfilename(
             defaultextension=".xlsx",
-            filetypes=[("Excel files", "*.xlsx")]
+            filetypes=[("Excel files", "*.xlsx"), ("CSV files", "*.csv"), ("JSON Lines", "*.jsonl"), ("Parquet files", "*.parquet")]
         )
         if filename:
             self.output_file.delete(0, "end")
@@ -305,8 +343,7 @@ class BrowserAssistantGUI:
 
     def load_profiles(self):
         try:
-            config = Config.load()
-            profile_names = list(config.profiles.keys())
+            profile_names = self.config_store.profile_names()
             self.profile_combo.configure(values=profile_names)
             if profile_names:
                 self.profile_var.set(profile_names[0])
@@ -315,8 +352,7 @@ class BrowserAssistantGUI:
             self.show_error(f'Ошибка загрузки профилей: {str(e)}')
 
     def load_profile(self, profile_name: str):
-        config = Config.load()
-        profile = config.profiles[profile_name]
+        profile = self.config_store.profile(profile_name)
         
         self.prompt.delete("1.0", "end")
         self.prompt.insert("1.0", profile.prompt)
@@ -413,18 +449,95 @@ class BrowserAssistantGUI:
         # Ждем закрытия окна
         dialog.wait_window()
 
-    async def run_processor(self):
+    async def run_processor(self, control: RunControl):
+        """Выполняется в фоновом потоке; в Tk ничего не вызывает, только пишет в self.events"""
         processor = None  # Объявляем переменную до try блока
         try:
-            config = Config.load()
-            processor = DataProcessor(config)
-            await processor.process_data()
-            self.show_error(self.localization.get("processing_complete"))
+            config = self.config_store.get()
+            if config.profiles[config.profile_name].shards > 1:
+                # Шарды обрабатываются в отдельных процессах со своими ресурсами
+                await ShardedRunner(config).run(control=control)
+            else:
+                processor = DataProcessor(
+                    config,
+                    control=control,
+                    on_progress=lambda snapshot: self.events.put(("progress", snapshot))
+                )
+                await processor.process_data()
+            self.events.put(("cancelled" if control.cancelled else "done", None))
         except Exception as e:
-            self.show_error(f'Ошибка при обработке: {str(e)}')
+            self.events.put(("error", f'Ошибка при обработке: {str(e)}'))
         finally:
             if processor:
-                await processor.browser_manager.cleanup()
+                await processor.cleanup()
+            self.events.put(("finished", None))
+
+    def poll_events(self):
+        """Забирает события фонового запуска в потоке Tk"""
+        # Из пачки прогресса достаточно показать последнее значение
+        progress = None
+        messages = []
+        finished = False
+        while True:
+            try:
+                kind, payload = self.events.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "progress":
+                progress = payload
+            elif kind == "finished":
+                finished = True
+            else:
+                messages.append((kind, payload))
+        
+        if progress is not None:
+            self.show_stats(progress)
+        if finished:
+            self.finish_run()
+        for kind, payload in messages:
+            if kind == "done":
+                self.show_error(self.localization.get("processing_complete"))
+            elif kind == "cancelled":
+                self.show_error(self.localization.get("processing_cancelled"))
+            elif kind == "error":
+                self.show_error(payload)
+        if not finished:
+            self.root.after(100, self.poll_events)
+
+    def show_stats(self, snapshot: StatsSnapshot):
+        """Обновляет живую панель запуска"""
+        self.status_label.configure(
+            text=self.localization.get("rows_processed").format(rows=snapshot.done + snapshot.failed)
+        )
+        self.stats_label.configure(text=self.localization.get("live_stats").format(
+            done=snapshot.done,
+            failed=snapshot.failed,
+            inflight=snapshot.inflight,
+            total=snapshot.total if snapshot.total is not None else "?",
+            rate=snapshot.rows_per_second,
+            llm=snapshot.llm_latency,
+            page=snapshot.page_latency,
+            tps=snapshot.tokens_per_second,
+            cost=snapshot.cost,
+            eta=format_duration(snapshot.eta_seconds)
+        ))
+
+    def finish_run(self):
+        """Возвращает кнопки в исходное состояние после завершения запуска"""
+        self.worker_thread = None
+        self.control = None
+        self.is_paused = False
+        self.run_button.configure(state="normal")
+        self.pause_button.configure(state="disabled", text=self.localization.get("pause_button"))
+        self.stop_button.configure(state="disabled")
+
+    def stop_process(self):
+        """Отменяет запуск: новые строки не выдаются, начатые дорабатывают"""
+        if self.control:
+            self.control.cancel()
+            self.stop_button.configure(state="disabled")
+            self.pause_button.configure(state="disabled")
+            self.status_label.configure(text=self.localization.get("stopping"))
 
     def run_process(self):
         """Запускает процесс обработки"""
@@ -468,28 +581,40 @@ class BrowserAssistantGUI:
                 return
                 
             model_config = AVAILABLE_MODELS[model_name]
-            config = Config.load()
+            api_keys = self.config_store.api_keys()
             
-            if model_config.provider == "openai" and not config.api_keys.openai:
+            if model_config.provider == "openai" and not api_keys.openai:
                 self.show_error(self.localization.get("no_openai_key"))
                 return
-            elif model_config.provider == "anthropic" and not config.api_keys.anthropic:
+            elif model_config.provider == "anthropic" and not api_keys.anthropic:
                 self.show_error(self.localization.get("no_anthropic_key"))
                 return
             
-            # Активируем кнопку паузы
-            self.pause_button.configure(state="normal")
-            
-            # Запускаем обработку
-            asyncio.run(self.run_processor())
-            
         except KeyError:
             self.show_error(self.localization.get("invalid_model"))
+            return
         except Exception as e:
             self.show_error(str(e))
-        finally:
-            # Деактивируем кнопку паузы
-            self.pause_button.configure(state="disabled")
+            return
+        
+        if self.worker_thread and self.worker_thread.is_alive():
+            return
+        
+        # Активируем кнопки управления запуском
+        self.run_button.configure(state="disabled")
+        self.pause_button.configure(state="normal")
+        self.stop_button.configure(state="normal")
+        self.status_label.configure(text=self.localization.get("processing"))
+        self.stats_label.configure(text="")
+        
+        # Запускаем обработку в фоновом потоке, окно остается отзывчивым
+        self.control = RunControl()
+        self.worker_thread = threading.Thread(
+            target=lambda control=self.control: asyncio.run(self.run_processor(control)),
+            daemon=True
+        )
+        self.worker_thread.start()
+        self.root.after(100, self.poll_events)
 
     def run(self):
         self.root.mainloop()
@@ -544,17 +669,21 @@ class BrowserAssistantGUI:
 
     def toggle_pause(self):
         """Переключает состояние паузы"""
+        if not self.control:
+            return
         self.is_paused = not self.is_paused
         if self.is_paused:
+            self.control.pause()
             self.pause_button.configure(
                 text=self.localization.get("resume_button")
             )
-            self.show_status(self.localization.get("paused"))
+            self.status_label.configure(text=self.localization.get("paused"))
         else:
+            self.control.resume()
             self.pause_button.configure(
                 text=self.localization.get("pause_button")
             )
-            self.show_status(self.localization.get("resumed"))
+            self.status_label.configure(text=self.localization.get("resumed"))
 
     def show_status(self, message: str):
         """Показывает статусное сообщение"""
@@ -0,0 +1,101 @@
+import asyncio
+import importlib.util
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# HTTP/2 включается только если установлен пакет h2
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+POOL_LIMITS = httpx.Limits(
+    max_connections=100,
+    max_keepalive_connections=20,
+    keepalive_expiry=60
+)
+POOL_TIMEOUT = httpx.Timeout(120, connect=10)
+
+
+@dataclass
+class PoolStats:
+    """Счетчики одного пула соединений"""
+    requests: int = 0
+    responses: int = 0
+    errors: int = 0
+    status_codes: Dict[int, int] = field(default_factory=dict)
+
+
+_CLIENTS: Dict[Tuple[str, int], httpx.AsyncClient] = {}
+_STATS: Dict[str, PoolStats] = {}
+
+
+def loop_id() -> int:
+    # Соединения httpx привязаны к циклу событий, в котором открыты
+    try:
+        return id(asyncio.get_running_loop())
+    except RuntimeError:
+        return 0
+
+
+def get_http_client(name: str) -> httpx.AsyncClient:
+    """Общий клиент с keep-alive пулом для подсистемы name (провайдер, fetcher)"""
+    key = (name, loop_id())
+    client = _CLIENTS.get(key)
+    if client is None or client.is_closed:
+        stats = _STATS.setdefault(name, PoolStats())
+
+        async def on_request(request):
+            stats.requests += 1
+
+        async def on_response(response):
+            stats.responses += 1
+            stats.status_codes[response.status_code] = stats.status_codes.get(response.status_code, 0) + 1
+            if response.status_code >= 400:
+                stats.errors += 1
+
+        client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            limits=POOL_LIMITS,
+            timeout=POOL_TIMEOUT,
+            event_hooks={"request": [on_request], "response": [on_response]}
+        )
+        _CLIENTS[key] = client
+    return client
+
+
+def _connections(client: httpx.AsyncClient) -> Tuple[int, int]:
+    """Открытые и простаивающие соединения пула (если транспорт их раскрывает)"""
+    pool = getattr(getattr(client, "_transport", None), "_pool", None)
+    connections = getattr(pool, "connections", None) or []
+    idle = sum(1 for conn in connections if getattr(conn, "is_idle", lambda: False)())
+    return len(connections), idle
+
+
+def pool_stats() -> Dict[str, Dict[str, int]]:
+    """Метрики пулов соединений по подсистемам"""
+    report = {}
+    for name, stats in _STATS.items():
+        open_connections = idle_connections = 0
+        for (client_name, _), client in _CLIENTS.items():
+            if client_name == name and not client.is_closed:
+                opened, idle = _connections(client)
+                open_connections += opened
+                idle_connections += idle
+        report[name] = {
+            "requests": stats.requests,
+            "responses": stats.responses,
+            "errors": stats.errors,
+            "open_connections": open_connections,
+            "idle_connections": idle_connections
+        }
+    return report
+
+
+async def close_http_clients():
+    """Закрывает клиенты текущего цикла событий"""
+    current = loop_id()
+    for key in [key for key in _CLIENTS if key[1] == current]:
+        await _CLIENTS.pop(key).aclose()
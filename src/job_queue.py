@@ -0,0 +1,258 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# После стольких аренд без результата задача считается проваленной
+MAX_ATTEMPTS = 3
+
+
+@dataclass
+class LeasedTask:
+    """Задача, арендованная воркером до истечения таймаута видимости"""
+    job: str
+    id: str
+    payload: Dict[str, Any]
+    attempts: int
+
+
+class JobQueue:
+    """Интерфейс очереди задач задания.
+
+    Координатор кладет задачи и забирает результаты, воркеры арендуют задачи.
+    Аренда истекает через visibility_timeout, после чего задачу получает
+    другой воркер: упавший процесс не теряет строки.
+    """
+
+    def put(self, job: str, tasks: Iterable[Tuple[str, Dict[str, Any]]]) -> int:
+        """Добавляет задачи (id, payload); уже известные id пропускаются. Возвращает число новых"""
+        raise NotImplementedError
+
+    def lease(self, job: str, limit: int, visibility_timeout: float) -> List[LeasedTask]:
+        """Арендует до limit видимых задач"""
+        raise NotImplementedError
+
+    def complete(self, task: LeasedTask, result: Optional[Dict[str, Any]]):
+        """Сохраняет результат задачи; None - строка не обработана"""
+        raise NotImplementedError
+
+    def unfinished(self, job: str) -> int:
+        """Число задач без результата, включая арендованные"""
+        raise NotImplementedError
+
+    def take_results(self, job: str) -> Dict[str, Optional[Dict[str, Any]]]:
+        """Забирает готовые результаты и удаляет их задачи из очереди"""
+        raise NotImplementedError
+
+    def cancel(self, job: str) -> int:
+        """Удаляет задачи без результата, включая арендованные. Возвращает их число"""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class SQLiteJobQueue(JobQueue):
+    """Очередь в файле SQLite: блокировки файла позволяют работать нескольким процессам"""
+
+    def __init__(self, path: str = "job_queue.sqlite", max_attempts: int = MAX_ATTEMPTS):
+        self.path = path
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS tasks (
+                job TEXT NOT NULL,
+                id TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                done INTEGER NOT NULL DEFAULT 0,
+                visible_at REAL NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                result TEXT,
+                PRIMARY KEY (job, id)
+            )"""
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS tasks_visible ON tasks (job, done, visible_at)"
+        )
+
+    @contextmanager
+    def _transaction(self):
+        """BEGIN IMMEDIATE берет блокировку записи: два процесса не арендуют одну задачу"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def put(self, job: str, tasks: Iterable[Tuple[str, Dict[str, Any]]]) -> int:
+        now = time.time()
+        rows = [
+            (job, task_id, json.dumps(payload, ensure_ascii=False, default=str), now)
+            for task_id, payload in tasks
+        ]
+        with self._transaction() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO tasks (job, id, payload, visible_at) VALUES (?, ?, ?, ?)",
+                rows
+            )
+            return conn.total_changes - before
+
+    def lease(self, job: str, limit: int, visibility_timeout: float) -> List[LeasedTask]:
+        now = time.time()
+        with self._transaction() as conn:
+            # Задачи, чья аренда истекала слишком много раз, завершаются без результата
+            conn.execute(
+                "UPDATE tasks SET done = 1 WHERE job = ? AND done = 0 AND visible_at <= ? AND attempts >= ?",
+                (job, now, self.max_attempts)
+            )
+            rows = conn.execute(
+                "SELECT id, payload, attempts FROM tasks WHERE job = ? AND done = 0 AND visible_at <= ? LIMIT ?",
+                (job, now, limit)
+            ).fetchall()
+            conn.executemany(
+                "UPDATE tasks SET visible_at = ?, attempts = attempts + 1 WHERE job = ? AND id = ?",
+                [(now + visibility_timeout, job, task_id) for task_id, _, _ in rows]
+            )
+        return [
+            LeasedTask(job, task_id, json.loads(payload), attempts + 1)
+            for task_id, payload, attempts in rows
+        ]
+
+    def complete(self, task: LeasedTask, result: Optional[Dict[str, Any]]):
+        encoded = None if result is None else json.dumps(result, ensure_ascii=False, default=str)
+        with self._lock:
+            self._conn.execute(
+                "UPDATE tasks SET done = 1, result = ? WHERE job = ? AND id = ?",
+                (encoded, task.job, task.id)
+            )
+
+    def unfinished(self, job: str) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM tasks WHERE job = ? AND done = 0", (job,)
+            ).fetchone()[0]
+
+    def take_results(self, job: str) -> Dict[str, Optional[Dict[str, Any]]]:
+        with self._transaction() as conn:
+            rows = conn.execute(
+                "SELECT id, result FROM tasks WHERE job = ? AND done = 1", (job,)
+            ).fetchall()
+            conn.execute("DELETE FROM tasks WHERE job = ? AND done = 1", (job,))
+        return {task_id: None if result is None else json.loads(result) for task_id, result in rows}
+
+    def cancel(self, job: str) -> int:
+        with self._transaction() as conn:
+            before = conn.total_changes
+            conn.execute("DELETE FROM tasks WHERE job = ? AND done = 0", (job,))
+            return conn.total_changes - before
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class RedisJobQueue(JobQueue):
+    """Очередь в Redis или совместимом сервере (KeyDB, Valkey, Dragonfly).
+
+    Ключи задания: pending (список id), payloads и results (хеши),
+    leases (упорядоченное множество id по сроку аренды), attempts (хеш).
+    """
+
+    def __init__(self, url: str, max_attempts: int = MAX_ATTEMPTS):
+        import redis
+
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+        self.max_attempts = max_attempts
+
+    @staticmethod
+    def _key(job: str, name: str) -> str:
+        return f"jobq:{job}:{name}"
+
+    def put(self, job: str, tasks: Iterable[Tuple[str, Dict[str, Any]]]) -> int:
+        added = 0
+        for task_id, payload in tasks:
+            encoded = json.dumps(payload, ensure_ascii=False, default=str)
+            if self.client.hsetnx(self._key(job, "payloads"), task_id, encoded):
+                self.client.rpush(self._key(job, "pending"), task_id)
+                added += 1
+        return added
+
+    def _requeue_expired(self, job: str, now: float):
+        leases = self._key(job, "leases")
+        for task_id in self.client.zrangebyscore(leases, 0, now):
+            # zrem удается только одному воркеру, поэтому задача возвращается один раз
+            if self.client.zrem(leases, task_id):
+                if int(self.client.hget(self._key(job, "attempts"), task_id) or 0) >= self.max_attempts:
+                    self._finish(job, task_id, "")
+                else:
+                    self.client.rpush(self._key(job, "pending"), task_id)
+
+    def lease(self, job: str, limit: int, visibility_timeout: float) -> List[LeasedTask]:
+        now = time.time()
+        self._requeue_expired(job, now)
+        leased = []
+        for _ in range(limit):
+            task_id = self.client.lpop(self._key(job, "pending"))
+            if task_id is None:
+                break
+            payload = self.client.hget(self._key(job, "payloads"), task_id)
+            if payload is None:
+                continue
+            self.client.zadd(self._key(job, "leases"), {task_id: now + visibility_timeout})
+            attempts = self.client.hincrby(self._key(job, "attempts"), task_id, 1)
+            leased.append(LeasedTask(job, task_id, json.loads(payload), attempts))
+        return leased
+
+    def _finish(self, job: str, task_id: str, encoded: str):
+        pipe = self.client.pipeline()
+        pipe.hset(self._key(job, "results"), task_id, encoded)
+        pipe.hdel(self._key(job, "payloads"), task_id)
+        pipe.hdel(self._key(job, "attempts"), task_id)
+        pipe.execute()
+
+    def complete(self, task: LeasedTask, result: Optional[Dict[str, Any]]):
+        self.client.zrem(self._key(task.job, "leases"), task.id)
+        # В хеше Redis нет None, пустая строка означает необработанную строку
+        encoded = "" if result is None else json.dumps(result, ensure_ascii=False, default=str)
+        self._finish(task.job, task.id, encoded)
+
+    def unfinished(self, job: str) -> int:
+        return self.client.hlen(self._key(job, "payloads"))
+
+    def take_results(self, job: str) -> Dict[str, Optional[Dict[str, Any]]]:
+        results = self._key(job, "results")
+        taken = {}
+        for task_id, encoded in self.client.hgetall(results).items():
+            if self.client.hdel(results, task_id):
+                taken[task_id] = json.loads(encoded) if encoded else None
+        return taken
+
+    def cancel(self, job: str) -> int:
+        cancelled = self.client.hlen(self._key(job, "payloads"))
+        self.client.delete(*(self._key(job, name) for name in ("pending", "payloads", "leases", "attempts")))
+        return cancelled
+
+    def close(self):
+        self.client.close()
+
+
+def get_job_queue(url: str) -> JobQueue:
+    """Создает очередь по адресу из профиля: sqlite:///path или redis://host:port/db"""
+    if url.startswith("sqlite:///"):
+        return SQLiteJobQueue(url[len("sqlite:///"):])
+    elif url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisJobQueue(url)
+    else:
+        raise ValueError(f"Unsupported job queue: {url}")
@@ -0,0 +1,106 @@
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class LLMCache:
+    """Персистентный кэш ответов модели на SQLite.
+
+    Ключ - (модель, температура, готовый промпт). Кэшируются только
+    детерминированные запуски с temperature == 0. Устаревшие записи удаляются
+    по TTL, при превышении max_entries вытесняются давно не читанные (LRU).
+    """
+
+    def __init__(
+        self,
+        path: str = "llm_cache.sqlite",
+        ttl_seconds: int = 30 * 24 * 3600,
+        max_entries: int = 100_000
+    ):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )"""
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)"
+        )
+
+    @staticmethod
+    def enabled_for(temperature: float) -> bool:
+        """Кэш имеет смысл только для детерминированных ответов"""
+        return temperature == 0
+
+    @staticmethod
+    def make_key(model: str, temperature: float, prompt: str) -> str:
+        return hashlib.sha256(f"{model}\n{temperature}\n{prompt}".encode("utf-8")).hexdigest()
+
+    def get(self, model: str, temperature: float, prompt: str) -> Optional[str]:
+        """Возвращает сохраненный ответ или None"""
+        key = self.make_key(model, temperature, prompt)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl_seconds:
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            self.hits += 1
+            return row[0]
+
+    def set(self, model: str, temperature: float, prompt: str, response: str):
+        """Сохраняет ответ модели"""
+        key = self.make_key(model, temperature, prompt)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                (key, response, now, now)
+            )
+            self._writes += 1
+            # Очистку делаем не на каждую запись, чтобы не замедлять горячий путь
+            if self._writes % 100 == 1:
+                self._evict(now)
+
+    def _evict(self, now: float):
+        self._conn.execute(
+            "DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,)
+        )
+        count = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        if count > self.max_entries:
+            self._conn.execute(
+                """DELETE FROM responses WHERE key IN (
+                    SELECT key FROM responses ORDER BY accessed_at LIMIT ?
+                )""",
+                (count - self.max_entries,)
+            )
+
+    def stats(self) -> str:
+        total = self.hits + self.misses
+        ratio = self.hits / total * 100 if total else 0.0
+        return f"LLM cache: {self.hits} hits, {self.misses} misses ({ratio:.1f}% hit rate)"
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
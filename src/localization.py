@@ -61,6 +61,7 @@ DEFAULT_TRANSLATIONS = {
         "run_button": "▶️ Run",
         "pause_button": "⏸️ Pause",
         "resume_button": "▶️ Resume",
+        "stop_button": "⏹️ Stop",
         "ok": "OK",
         "cancel": "Cancel",
         "save": "Save",
@@ -74,6 +75,8 @@ DEFAULT_TRANSLATIONS = {
         "output_columns": "Output columns:",
         "model": "Model:",
         "temperature": "Temperature:",
+        "output_format": "Output format:",
+        "output_format_auto": "By file extension",
         "parallel_browsers": "Parallel browsers:",
         
         # Чекбоксы
@@ -110,6 +113,12 @@ DEFAULT_TRANSLATIONS = {
         "paused": "Processing paused",
         "resumed": "Processing resumed",
         "completed": "Processing completed",
+        "stopping": "Stopping after rows in progress...",
+        "processing_cancelled": "Processing stopped.\nCompleted rows are saved, run again to continue.",
+        "rows_processed": "Rows processed: {rows}",
+        "live_stats": "Done: {done} of {total}   Failed: {failed}   In flight: {inflight}\n"
+                      "Speed: {rate:.2f} rows/s   LLM: {llm:.1f}s   Page: {page:.1f}s\n"
+                      "Tokens: {tps:.0f}/s   Cost: ${cost:.4f}   ETA: {eta}",
         "processing_error": "Error during processing: {error}",
         
         # Работа с профилями
@@ -134,6 +143,7 @@ DEFAULT_TRANSLATIONS = {
         "run_button": "▶️ Запустить",
         "pause_button": "⏸️ Пауза",
         "resume_button": "▶️ Продолжить",
+        "stop_button": "⏹️ Стоп",
         "ok": "OK",
         "cancel": "Отмена",
         "save": "Сохранить",
@@ -147,6 +157,8 @@ DEFAULT_TRANSLATIONS = {
         "output_columns": "Выходные колонки:",
         "model": "Модель:",
         "temperature": "Температура:",
+        "output_format": "Формат результата:",
+        "output_format_auto": "По расширению файла",
         "parallel_browsers": "Параллельные браузеры:",
         
         # Чекбоксы
@@ -183,6 +195,12 @@ DEFAULT_TRANSLATIONS = {
         "paused": "Обработка приостановлена",
         "resumed": "Обработка возобновлена",
         "completed": "Обработка завершена",
+        "stopping": "Остановка после текущих строк...",
+        "processing_cancelled": "Обработка остановлена.\nГотовые строки сохранены, повторный запуск продолжит работу.",
+        "rows_processed": "Обработано строк: {rows}",
+        "live_stats": "Готово: {done} из {total}   Ошибки: {failed}   В работе: {inflight}\n"
+                      "Скорость: {rate:.2f} строк/с   LLM: {llm:.1f}с   Страница: {page:.1f}с\n"
+                      "Токены: {tps:.0f}/с   Стоимость: ${cost:.4f}   Осталось: {eta}",
         "processing_error": "Ошибка при обработке: {error}",
         
         # Работа с профилями
@@ -0,0 +1,223 @@
+import bisect
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм, секунды
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+_NOOP = nullcontext()
+
+
+class Histogram:
+    """Гистограмма длительностей с фиксированными корзинами"""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """Оценка квантиля по верхней границе корзины"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class MetricsRegistry:
+    """Гистограммы этапов и счетчики с метками профиля и модели.
+
+    Пока сбор выключен, timer() возвращает общий пустой контекст, а observe()
+    и inc() выходят на первой проверке, поэтому горячий путь почти не платит.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @staticmethod
+    def _labels(labels: Dict[str, str]) -> Labels:
+        return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def observe(self, stage: str, seconds: float, **labels):
+        if not self.enabled:
+            return
+        key = (stage, self._labels(labels))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        if not self.enabled:
+            return
+        key = (name, self._labels(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def timer(self, stage: str, **labels):
+        """Контекст, замеряющий длительность этапа; работает и вокруг await"""
+        if not self.enabled:
+            return _NOOP
+        return self._timer(stage, labels)
+
+    @contextmanager
+    def _timer(self, stage: str, labels: Dict[str, str]) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started, **labels)
+
+    def render(self) -> str:
+        """Текстовый формат Prometheus"""
+        with self._lock:
+            histograms = {key: (list(h.counts), h.count, h.sum) for key, h in self.histograms.items()}
+            counters = dict(self.counters)
+
+        def fmt(labels: Labels, extra: str = "") -> str:
+            parts = [f'{key}="{value}"' for key, value in labels]
+            if extra:
+                parts.append(extra)
+            return "{" + ",".join(parts) + "}" if parts else ""
+
+        lines: List[str] = ["# TYPE webmatrix_stage_seconds histogram"]
+        for (stage, labels), (counts, count, total) in sorted(histograms.items()):
+            labels = (("stage", stage),) + labels
+            cumulative = 0
+            for bound, bucket in zip(BUCKETS, counts):
+                cumulative += bucket
+                le = 'le="%s"' % bound
+                lines.append(f"webmatrix_stage_seconds_bucket{fmt(labels, le)} {cumulative}")
+            le = 'le="+Inf"'
+            lines.append(f"webmatrix_stage_seconds_bucket{fmt(labels, le)} {count}")
+            lines.append(f"webmatrix_stage_seconds_sum{fmt(labels)} {total}")
+            lines.append(f"webmatrix_stage_seconds_count{fmt(labels)} {count}")
+        for name in sorted({name for name, _ in counters}):
+            lines.append(f"# TYPE webmatrix_{name} counter")
+            for (counter, labels), value in sorted(counters.items()):
+                if counter == name:
+                    lines.append(f"webmatrix_{name}{fmt(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> Dict[str, object]:
+        """Сводка запуска: число замеров, суммарное время и квантили по этапам"""
+        with self._lock:
+            stages = [
+                {
+                    "stage": stage,
+                    **dict(labels),
+                    "count": h.count,
+                    "total_seconds": round(h.sum, 3),
+                    "avg_seconds": round(h.sum / h.count, 4) if h.count else 0.0,
+                    "p50_seconds": h.quantile(0.5),
+                    "p95_seconds": h.quantile(0.95),
+                    "buckets": list(h.counts)
+                }
+                for (stage, labels), h in sorted(self.histograms.items())
+            ]
+            counters = [
+                {"counter": name, **dict(labels), "value": value}
+                for (name, labels), value in sorted(self.counters.items())
+            ]
+        return {"stages": stages, "counters": counters}
+
+    def merge_summary(self, summary: Dict[str, object]):
+        """Добавляет в реестр сводку другого процесса, например шарда"""
+        with self._lock:
+            for entry in summary.get("stages", []):
+                entry = dict(entry)
+                stage = entry.pop("stage")
+                buckets = entry.pop("buckets", None)
+                count = entry.pop("count")
+                total = entry.pop("total_seconds")
+                for key in ("avg_seconds", "p50_seconds", "p95_seconds"):
+                    entry.pop(key, None)
+                key = (stage, self._labels(entry))
+                histogram = self.histograms.get(key)
+                if histogram is None:
+                    histogram = self.histograms[key] = Histogram()
+                if buckets:
+                    histogram.counts = [a + b for a, b in zip(histogram.counts, buckets)]
+                histogram.count += count
+                histogram.sum += total
+            for entry in summary.get("counters", []):
+                entry = dict(entry)
+                name = entry.pop("counter")
+                value = entry.pop("value")
+                key = (name, self._labels(entry))
+                self.counters[key] = self.counters.get(key, 0) + value
+
+    def write_summary(self, path: Path):
+        if not self.enabled:
+            return
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.summary(), f, indent=2, ensure_ascii=False)
+        logger.info(f"Metrics summary saved to {path}")
+
+    def serve(self, port: int, host: str = "127.0.0.1"):
+        """Запускает локальный эндпоинт /metrics в фоновом потоке"""
+        if self._server is not None:
+            return
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        logger.info(f"Metrics endpoint: http://{host}:{port}/metrics")
+
+    def shutdown(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+# Общий реестр процесса
+METRICS = MetricsRegistry()
+
+
+def configure_metrics(enabled: bool, port: int = 0) -> MetricsRegistry:
+    """Включает сбор метрик и, если задан порт, эндпоинт /metrics"""
+    METRICS.enabled = enabled
+    if enabled and port:
+        METRICS.serve(port)
+    return METRICS
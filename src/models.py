@@ -1,8 +1,13 @@
-from typing import Dict, Any
+from typing import TYPE_CHECKING, ClassVar, Dict, Any, Optional, Tuple
 from dataclasses import dataclass
-from langchain_openai import ChatOpenAI
-from langchain_anthropic import ChatAnthropic
-from langchain.chat_models.base import BaseChatModel
+
+# SDK провайдеров импортируются при создании первого клиента:
+# GUI и CLI, которым нужен только список моделей, не платят за их загрузку
+if TYPE_CHECKING:
+    from langchain.chat_models.base import BaseChatModel
+
+from .http_pool import close_http_clients, get_http_client, loop_id
+from .rate_limiter import RateLimiter, estimate_tokens, get_rate_limiter
 
 @dataclass
 class ModelConfig:
@@ -11,49 +16,137 @@ class ModelConfig:
     description_key: str
     params: Dict[str, Any]
     default_temp: float = 0.0
+    # Лимиты провайдера: запросов и токенов в минуту
+    rpm: int = 500
+    tpm: int = 200_000
+    # Цена за миллион токенов запроса и ответа, USD
+    input_price: float = 0.0
+    output_price: float = 0.0
 
 AVAILABLE_MODELS = {
     "gpt-4o-mini": ModelConfig(
         name="gpt-4o-mini",
         provider="openai",
         description_key="model_gpt4o_mini_desc",
-        params={"model": "gpt-4o-mini"}
+        params={"model": "gpt-4o-mini"},
+        input_price=0.15,
+        output_price=0.60
     ),
     "gpt-4o": ModelConfig(
         name="gpt-4o",
         provider="openai",
         description_key="model_gpt4o_desc",
-        params={"model": "gpt-4o"}
+        params={"model": "gpt-4o"},
+        tpm=30_000,
+        input_price=2.50,
+        output_price=10.00
     ),
     "claude-3-sonnet": ModelConfig(
         name="claude-3-sonnet",
         provider="anthropic",
         description_key="model_claude3_sonnet_desc",
-        params={"model": "claude-3-sonnet"}
+        params={"model": "claude-3-sonnet"},
+        rpm=50,
+        tpm=40_000,
+        input_price=3.00,
+        output_price=15.00
     )
 }
 
-def get_model(config: "Config") -> BaseChatModel:
-    """Создает модель на основе конфигурации"""
-    profile = config.profiles[config.profile_name]
-    model_config = AVAILABLE_MODELS[profile.model]
-    
-    # Добавляем температуру из профиля или используем дефолтную
+def get_limiter(model_name: str) -> RateLimiter:
+    """Общий лимитер запросов для модели из AVAILABLE_MODELS"""
+    model_config = AVAILABLE_MODELS[model_name]
+    return get_rate_limiter(
+        model_config.provider,
+        model_config.params["model"],
+        model_config.rpm,
+        model_config.tpm
+    )
+
+def estimate_cost(model_name: str, prompt_tokens: int, completion_tokens: int) -> float:
+    """Стоимость вызова в USD по ценам из AVAILABLE_MODELS"""
+    model_config = AVAILABLE_MODELS[model_name]
+    return (prompt_tokens * model_config.input_price + completion_tokens * model_config.output_price) / 1_000_000
+
+# Общие клиенты моделей: один на (провайдер, параметры, ключ, лимитер, цикл событий)
+_MODELS: Dict[Tuple, "BaseChatModel"] = {}
+_LIMITED_CLASSES: Dict[Tuple[type, str], type] = {}
+
+def _limited_class(cls: type, model_name: str) -> type:
+    """Подкласс клиента LangChain, каждый вызов которого проходит через лимитер модели.
+
+    Агент browser_use делает десятки вызовов за строку: так каждый списывает
+    свой запрос и токены, а после 429 повторяется только он, а не весь прогон агента.
+    """
+    key = (cls, model_name)
+    if key not in _LIMITED_CLASSES:
+        class Limited(cls):
+            limiter_model: ClassVar[str] = model_name
+
+            async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+                tokens = sum(estimate_tokens(str(message.content)) for message in messages)
+                return await get_limiter(self.limiter_model).call(
+                    lambda: super(Limited, self)._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs),
+                    tokens=tokens
+                )
+
+        Limited.__name__ = f"Limited{cls.__name__}"
+        _LIMITED_CLASSES[key] = Limited
+    return _LIMITED_CLASSES[key]
+
+def get_chat_model(model_name: str, temperature: Optional[float] = None,
+                   api_keys: Optional["APIKeys"] = None, limited: bool = False) -> "BaseChatModel":
+    """Возвращает общий клиент модели из AVAILABLE_MODELS.
+
+    Все подсистемы получают один и тот же экземпляр и переиспользуют
+    его прогретые соединения. limited=True - клиент сам проходит через
+    лимитер модели; он нужен агентам, вызовы которых не видны снаружи.
+    """
+    model_config = AVAILABLE_MODELS[model_name]
+    # max_retries=0: повторы и паузы после 429 решает только общий лимитер,
+    # скрытые повторы SDK не списывались бы с его бакетов
     params = {
         **model_config.params,
-        "temperature": profile.temperature if hasattr(profile, "temperature") 
-                      else model_config.default_temp
+        "temperature": model_config.default_temp if temperature is None else temperature
     }
+    # Ключ None - SDK провайдера возьмет его из переменных окружения
+    api_key = getattr(api_keys, model_config.provider, None) if api_keys else None
+    key = (model_config.provider, tuple(sorted(params.items())), api_key, limited, loop_id())
+    if key in _MODELS:
+        return _MODELS[key]
     
     if model_config.provider == "openai":
-        return ChatOpenAI(
-            api_key=config.api_keys.openai,
+        from langchain_openai import ChatOpenAI
+        model_class = _limited_class(ChatOpenAI, model_name) if limited else ChatOpenAI
+        model = model_class(
+            api_key=api_key,
+            http_async_client=get_http_client("openai"),
+            max_retries=0,
             **params
         )
     elif model_config.provider == "anthropic":
-        return ChatAnthropic(
-            api_key=config.api_keys.anthropic,
+        from langchain_anthropic import ChatAnthropic
+        model_class = _limited_class(ChatAnthropic, model_name) if limited else ChatAnthropic
+        # SDK Anthropic держит собственный пул соединений внутри общего экземпляра
+        model = model_class(
+            api_key=api_key,
+            max_retries=0,
             **params
         )
     else:
-        raise ValueError(f"Unsupported model provider: {model_config.provider}") 
\ No newline at end of file
+        raise ValueError(f"Unsupported model provider: {model_config.provider}")
+    
+    _MODELS[key] = model
+    return model
+
+async def close_model_clients():
+    """Освобождает клиенты моделей и пулы соединений текущего цикла событий"""
+    current = loop_id()
+    for key in [key for key in _MODELS if key[-1] == current]:
+        del _MODELS[key]
+    await close_http_clients()
+
+def get_model(config: "Config", limited: bool = False) -> "BaseChatModel":
+    """Возвращает модель профиля из общего реестра клиентов"""
+    profile = config.profiles[config.profile_name]
+    return get_chat_model(profile.model, profile.temperature, config.api_keys, limited)
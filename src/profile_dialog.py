@@ -1,7 +1,10 @@
 import customtkinter as ctk
 from typing import Optional, Dict, Any
-from .config import Config, Profile, BrowserConfig
+from dataclasses import replace
+from .config import Profile, BrowserConfig
+from .config_store import get_config_store
 from .models import AVAILABLE_MODELS
+from .writers import WRITERS
 from .widgets import LabelWithTooltip, CheckboxWithTooltip, BetterTextbox
 
 class ProfileDialog:
@@ -102,6 +105,20 @@ class ProfileDialog:
         )
         self.model.pack(pady=(0, 15))
         
+        # Формат результата
+        ctk.CTkLabel(
+            self.main_frame,
+            text=self.localization.get("output_format")
+        ).pack(anchor="w", pady=(0, 5))
+        
+        self.output_format = ctk.CTkComboBox(
+            self.main_frame,
+            values=[self.localization.get("output_format_auto"), *WRITERS],
+            width=600
+        )
+        self.output_format.pack(pady=(0, 15))
+        self.output_format.set(self.localization.get("output_format_auto"))
+        
         # Настройки браузера
         browser_frame = ctk.CTkFrame(self.main_frame)
         browser_frame.pack(fill="x", pady=(0, 15))
@@ -203,8 +220,7 @@ class ProfileDialog:
         
     def load_profile(self, profile_name: str):
         """Загружает данные профиля"""
-        config = Config.load()
-        profile = config.profiles[profile_name]
+        profile = get_config_store().profile(profile_name)
         
         self.name.insert(0, profile_name)
         self.description.insert(0, profile.description)
@@ -215,6 +231,8 @@ class ProfileDialog:
         # Находим полное название модели
         model_name = f"{profile.model} - {self.localization.get(AVAILABLE_MODELS[profile.model].description_key)}"
         self.model.set(model_name)
+        if profile.output_format:
+            self.output_format.set(profile.output_format)
         
         if profile.browser_config:
             self.parallel.set(profile.browser_config.max_parallel)
@@ -254,19 +272,29 @@ class ProfileDialog:
             ],
             "model": model_name,
             "temperature": float(self.temperature.get()),
-            "browser_config": {
-                "max_parallel": int(self.parallel.get()),
-                "headless": bool(self.headless.get()),
-                "timeout": 30
-            },
-            "use_browser": bool(self.use_browser.get())
+            "use_browser": bool(self.use_browser.get()),
+            "output_format": self.output_format.get() if self.output_format.get() in WRITERS else None
         }
         
-        # Сохраняем в конфиг
-        config = Config.load()
+        # Сохраняем в конфиг; настройки, которых нет в окне, остаются от редактируемого профиля
+        store = get_config_store()
         profile_name = self.name.get().strip()
-        
-        config.profiles[profile_name] = Profile(**profile_data)
-        config.save()
+        existing = store.profile(self.profile_name) if self.profile_name in store.profile_names() else None
+        
+        if existing:
+            profile_data["browser_config"] = replace(
+                existing.browser_config or BrowserConfig(),
+                max_parallel=int(self.parallel.get()),
+                headless=bool(self.headless.get())
+            )
+            profile = replace(existing, **profile_data)
+        else:
+            profile_data["browser_config"] = BrowserConfig(
+                max_parallel=int(self.parallel.get()),
+                headless=bool(self.headless.get()),
+                timeout=30
+            )
+            profile = Profile(**profile_data)
+        store.put_profile(profile_name, profile)
         
         self.dialog.destroy() 
\ No newline at end of file
@@ -0,0 +1,190 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from .deadlines import paused_deadline
+
+logger = logging.getLogger(__name__)
+
+# Коды ответа, после которых запрос имеет смысл повторить
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 529}
+
+
+def estimate_tokens(text: str) -> int:
+    """Грубая оценка числа токенов для бакета TPM"""
+    return max(1, len(text) // 4)
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        response = getattr(error, "response", None)
+        status = getattr(response, "status_code", None)
+    return status
+
+
+def is_retryable(error: Exception) -> bool:
+    """Ошибка лимита провайдера или временная ошибка сервера"""
+    if _status_code(error) in RETRYABLE_STATUS_CODES:
+        return True
+    return "RateLimit" in type(error).__name__
+
+
+def is_rate_limited(error: Exception) -> bool:
+    return _status_code(error) == 429 or "RateLimit" in type(error).__name__
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Пауза из заголовков Retry-After / retry-after-ms, если провайдер ее прислал"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        return None
+    return None
+
+
+class TokenBucket:
+    """Бакет с непрерывным пополнением: rate единиц в минуту"""
+
+    def __init__(self, rate_per_minute: float):
+        self.capacity = float(rate_per_minute)
+        self.rate = float(rate_per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate / 60)
+        self.updated = now
+
+    def delay(self, amount: float) -> float:
+        """Сколько секунд ждать, прежде чем можно списать amount"""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) * 60 / self.rate
+
+    def take(self, amount: float):
+        self.tokens -= min(amount, self.capacity)
+
+
+class RateLimiter:
+    """Лимиты запросов (RPM) и токенов (TPM) для одной модели провайдера.
+
+    После 429 все вызовы модели ставятся на паузу по Retry-After, а скорость
+    снижается и затем плавно восстанавливается после успешных ответов.
+    """
+
+    def __init__(self, name: str, rpm: int, tpm: int, max_retries: int = 6,
+                 base_delay: float = 1.0, max_delay: float = 60.0):
+        self.name = name
+        self.rpm = rpm
+        self.tpm = tpm
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.paused_until = 0.0
+        self.throttled = 0
+        self._lock: Optional[asyncio.Lock] = None
+        self._loop = None
+
+    def _get_lock(self) -> asyncio.Lock:
+        # Лимитер общий на процесс, а циклы событий могут меняться между запусками
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    async def acquire(self, tokens: int = 1):
+        """Ждет, пока оба бакета позволят отправить запрос"""
+        async with self._get_lock():
+            while True:
+                wait = max(
+                    self.paused_until - time.monotonic(),
+                    self.requests.delay(1),
+                    self.tokens.delay(tokens)
+                )
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+            self.requests.take(1)
+            self.tokens.take(tokens)
+
+    def _slow_down(self, pause: float):
+        self.throttled += 1
+        self.paused_until = max(self.paused_until, time.monotonic() + pause)
+        self.requests.rate = max(self.rpm * 0.1, self.requests.rate * 0.8)
+        self.tokens.rate = max(self.tpm * 0.1, self.tokens.rate * 0.8)
+
+    def _recover(self):
+        self.requests.rate = min(self.rpm, self.requests.rate * 1.01)
+        self.tokens.rate = min(self.tpm, self.tokens.rate * 1.01)
+
+    async def call(self, factory: Callable[[], Awaitable[Any]], tokens: int = 1) -> Any:
+        """Выполняет вызов модели с учетом лимитов и повторами при 429/5xx.
+
+        factory должен создавать новую корутину на каждую попытку.
+        """
+        attempt = 0
+        while True:
+            # Ожидание лимитера не расходует бюджет времени строки
+            with paused_deadline():
+                await self.acquire(tokens)
+            try:
+                result = await factory()
+                self._recover()
+                return result
+            except Exception as e:
+                if not is_retryable(e) or attempt >= self.max_retries:
+                    raise
+                # Экспоненциальная пауза с джиттером, если провайдер не указал свою
+                delay = retry_after(e)
+                if delay is None:
+                    delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+                    delay = random.uniform(delay / 2, delay)
+                if is_rate_limited(e):
+                    self._slow_down(delay)
+                attempt += 1
+                logger.warning(
+                    f"{self.name}: {type(e).__name__}, retry {attempt}/{self.max_retries} in {delay:.1f}s"
+                )
+                with paused_deadline():
+                    await asyncio.sleep(delay)
+
+
+_LIMITERS: Dict[Tuple[str, str], RateLimiter] = {}
+
+# Доля лимитов провайдера, доступная процессу; при шардировании делится между воркерами
+_PROCESS_SHARE = 1.0
+
+
+def set_process_share(share: float):
+    """Задает долю лимитов для процесса до создания первых лимитеров"""
+    global _PROCESS_SHARE
+    _PROCESS_SHARE = share
+    _LIMITERS.clear()
+
+
+def get_rate_limiter(provider: str, model: str, rpm: int, tpm: int) -> RateLimiter:
+    """Общий лимитер на пару провайдер/модель для всего процесса"""
+    key = (provider, model)
+    if key not in _LIMITERS:
+        _LIMITERS[key] = RateLimiter(
+            f"{provider}/{model}",
+            max(1, int(rpm * _PROCESS_SHARE)),
+            max(1, int(tpm * _PROCESS_SHARE))
+        )
+    return _LIMITERS[key]
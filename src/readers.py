@@ -0,0 +1,144 @@
+import json
+import math
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+# Строк в одном чтении CSV и Parquet: память ограничена пачкой, а не размером файла
+CHUNK_ROWS = 5000
+
+
+def _clean(value: Any) -> Any:
+    """Пустые ячейки всех форматов приводятся к None"""
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+class InputReader:
+    """Потоковое чтение входного файла.
+
+    columns() читает только заголовок, rows() отдает строки по мере чтения,
+    не загружая файл целиком.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+
+    def columns(self) -> List[str]:
+        raise NotImplementedError
+
+    def rows(self) -> Iterator[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def row_count(self) -> Optional[int]:
+        """Число строк, если его можно узнать без чтения файла"""
+        return None
+
+    def validate(self, required: List[str]):
+        """Проверяет наличие нужных колонок по заголовку"""
+        columns = self.columns()
+        missing_columns = [col for col in required if col not in columns]
+        if missing_columns:
+            raise ValueError(f"Missing required columns: {', '.join(missing_columns)}")
+
+
+class CSVReader(InputReader):
+    def columns(self) -> List[str]:
+        import pandas as pd
+
+        return pd.read_csv(self.path, nrows=0).columns.tolist()
+
+    def rows(self) -> Iterator[Dict[str, Any]]:
+        import pandas as pd
+
+        for chunk in pd.read_csv(self.path, chunksize=CHUNK_ROWS):
+            for row in chunk.to_dict("records"):
+                yield {key: _clean(value) for key, value in row.items()}
+
+
+class XLSXReader(InputReader):
+    """Первый лист книги через read-only режим openpyxl"""
+
+    def _sheet(self):
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(self.path, read_only=True, data_only=True)
+        return workbook, workbook.worksheets[0]
+
+    def columns(self) -> List[str]:
+        workbook, sheet = self._sheet()
+        try:
+            header = next(sheet.iter_rows(max_row=1, values_only=True), ())
+            return [str(value) for value in header if value is not None]
+        finally:
+            workbook.close()
+
+    def rows(self) -> Iterator[Dict[str, Any]]:
+        workbook, sheet = self._sheet()
+        try:
+            values = sheet.iter_rows(values_only=True)
+            header = [str(value) if value is not None else None for value in next(values, ())]
+            for row in values:
+                if all(value is None for value in row):
+                    continue
+                yield {key: _clean(value) for key, value in zip(header, row) if key is not None}
+        finally:
+            workbook.close()
+
+    def row_count(self) -> Optional[int]:
+        workbook, sheet = self._sheet()
+        try:
+            # Размер из метаданных листа, может включать пустые строки в конце
+            return max(0, sheet.max_row - 1) if sheet.max_row else None
+        finally:
+            workbook.close()
+
+
+class JSONLReader(InputReader):
+    """Один JSON объект на строку; колонки - ключи первого объекта"""
+
+    def columns(self) -> List[str]:
+        for row in self.rows():
+            return list(row)
+        return []
+
+    def rows(self) -> Iterator[Dict[str, Any]]:
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+class ParquetReader(InputReader):
+    def _file(self):
+        import pyarrow.parquet as pq
+
+        return pq.ParquetFile(self.path)
+
+    def columns(self) -> List[str]:
+        return self._file().schema_arrow.names
+
+    def rows(self) -> Iterator[Dict[str, Any]]:
+        for batch in self._file().iter_batches(batch_size=CHUNK_ROWS):
+            for row in batch.to_pylist():
+                yield {key: _clean(value) for key, value in row.items()}
+
+    def row_count(self) -> Optional[int]:
+        return self._file().metadata.num_rows
+
+
+READERS = {
+    ".csv": CSVReader,
+    ".xlsx": XLSXReader,
+    ".jsonl": JSONLReader,
+    ".parquet": ParquetReader
+}
+
+
+def open_reader(path: Path) -> InputReader:
+    """Выбирает читателя по расширению файла"""
+    path = Path(path)
+    reader = READERS.get(path.suffix.lower())
+    if reader is None:
+        raise ValueError(f"Unsupported input format: {path.suffix}")
+    return reader(path)
@@ -0,0 +1,56 @@
+import asyncio
+from typing import Optional
+
+
+class RunControl:
+    """Пауза, продолжение и отмена запуска.
+
+    Методы pause, resume и cancel можно вызывать из любого потока (например,
+    из потока Tk), а планировщик ждет в wait() внутри своего цикла событий.
+    Пауза останавливает выдачу новых строк, уже начатые строки дорабатывают.
+    """
+
+    def __init__(self):
+        self.paused = False
+        self.cancelled = False
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._running: Optional[asyncio.Event] = None
+
+    def bind(self):
+        """Привязывает управление к текущему циклу событий; вызывается в начале запуска"""
+        self._loop = asyncio.get_running_loop()
+        self._running = asyncio.Event()
+        self._sync()
+
+    def _sync(self):
+        if self._running is None:
+            return
+        if self.paused and not self.cancelled:
+            self._running.clear()
+        else:
+            self._running.set()
+
+    def _notify(self):
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._sync)
+
+    def pause(self):
+        self.paused = True
+        self._notify()
+
+    def resume(self):
+        self.paused = False
+        self._notify()
+
+    def cancel(self):
+        """Новые строки больше не выдаются; готовые результаты сохраняются для resume"""
+        self.cancelled = True
+        self._notify()
+
+    async def wait(self):
+        """Ждет снятия паузы; после отмены возвращается сразу"""
+        if self._running is None:
+            self.bind()
+        if self.paused and not self.cancelled:
+            await self._running.wait()
@@ -0,0 +1,100 @@
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+# Вес нового замера в скользящем среднем задержек
+EWMA_ALPHA = 0.2
+
+
+@dataclass
+class StatsSnapshot:
+    """Состояние запуска для панели GUI"""
+    done: int
+    failed: int
+    inflight: int
+    total: Optional[int]
+    rows_per_second: float
+    llm_latency: float
+    page_latency: float
+    tokens_per_second: float
+    cost: float
+    eta_seconds: Optional[float]
+
+
+class RunStats:
+    """Счетчики и скользящие средние текущего запуска.
+
+    Обновления на горячем пути - это несколько сложений; снимок для GUI
+    собирается не чаще publish_interval секунд.
+    """
+
+    def __init__(self, on_snapshot: Optional[Callable[[StatsSnapshot], None]] = None,
+                 publish_interval: float = 0.5):
+        self.on_snapshot = on_snapshot
+        self.publish_interval = publish_interval
+        self.started = time.monotonic()
+        self.total: Optional[int] = None
+        self.done = 0
+        self.failed = 0
+        self.inflight = 0
+        self.tokens = 0
+        self.cost = 0.0
+        self.llm_latency = 0.0
+        self.page_latency = 0.0
+        self._published = 0.0
+
+    @staticmethod
+    def _average(current: float, value: float) -> float:
+        return value if current == 0 else current + EWMA_ALPHA * (value - current)
+
+    def dispatched(self, rows: int):
+        self.inflight += rows
+
+    def recorded(self, rows: int, ok: bool, dispatched: bool = True):
+        """Строки записаны; dispatched=False для строк, готовых без обращения к модели"""
+        if dispatched:
+            self.inflight = max(0, self.inflight - 1)
+        if ok:
+            self.done += rows
+        else:
+            self.failed += rows
+        self.publish()
+
+    def llm_call(self, seconds: float):
+        self.llm_latency = self._average(self.llm_latency, seconds)
+
+    def spent(self, tokens: int, cost: float):
+        self.tokens += tokens
+        self.cost += cost
+
+    def page(self, seconds: float):
+        self.page_latency = self._average(self.page_latency, seconds)
+
+    def snapshot(self) -> StatsSnapshot:
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        finished = self.done + self.failed
+        rate = finished / elapsed
+        eta = None
+        if self.total is not None and rate > 0:
+            eta = max(0, self.total - finished) / rate
+        return StatsSnapshot(
+            done=self.done,
+            failed=self.failed,
+            inflight=self.inflight,
+            total=self.total,
+            rows_per_second=rate,
+            llm_latency=self.llm_latency,
+            page_latency=self.page_latency,
+            tokens_per_second=self.tokens / elapsed,
+            cost=self.cost,
+            eta_seconds=eta
+        )
+
+    def publish(self, force: bool = False):
+        """Отдает снимок подписчику, если с прошлого прошло достаточно времени"""
+        if not self.on_snapshot:
+            return
+        now = time.monotonic()
+        if force or now - self._published >= self.publish_interval:
+            self._published = now
+            self.on_snapshot(self.snapshot())
@@ -0,0 +1,93 @@
+import asyncio
+import logging
+from typing import Any, AsyncIterable, Awaitable, Callable, Iterable, Optional, Union
+
+from .run_control import RunControl
+
+logger = logging.getLogger(__name__)
+
+# Маркер завершения очереди для воркеров
+_STOP = object()
+
+
+async def _aiter(items: Union[Iterable[Any], AsyncIterable[Any]]):
+    """Единый асинхронный обход для обычных и асинхронных итераторов"""
+    if hasattr(items, "__aiter__"):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
+            # Отдаем управление циклу, чтобы чтение строк не блокировало воркеров
+            await asyncio.sleep(0)
+
+
+class BoundedScheduler:
+    """Планировщик производитель/потребитель с ограниченной очередью.
+
+    Элементы читаются лениво: производитель блокируется, пока очередь заполнена,
+    поэтому в памяти одновременно находится не больше queue_size + max_workers задач.
+    RunControl на паузе придерживает выдачу задач воркерам, после отмены
+    оставшиеся в очереди задачи пропускаются.
+    """
+
+    def __init__(self, max_workers: int = 5, queue_size: Optional[int] = None,
+                 control: Optional[RunControl] = None):
+        self.max_workers = max(1, int(max_workers))
+        self.queue_size = queue_size or self.max_workers * 2
+        self.control = control
+
+    async def run(
+        self,
+        items: Union[Iterable[Any], AsyncIterable[Any]],
+        handler: Callable[[Any, int], Awaitable[Any]],
+        on_result: Optional[Callable[[Any, Any], None]] = None
+    ) -> int:
+        """Обрабатывает элементы воркерами, возвращает число обработанных элементов"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        processed = 0
+        control = self.control
+        if control:
+            control.bind()
+
+        async def producer():
+            try:
+                async for item in _aiter(items):
+                    if control and control.cancelled:
+                        break
+                    await queue.put(item)
+            finally:
+                for _ in range(self.max_workers):
+                    await queue.put(_STOP)
+
+        async def worker(worker_id: int):
+            nonlocal processed
+            while True:
+                if control:
+                    await control.wait()
+                item = await queue.get()
+                if item is _STOP:
+                    return
+                if control and control.cancelled:
+                    # Дочитываем очередь до маркера, не обрабатывая задачи
+                    continue
+                try:
+                    result = await handler(item, worker_id)
+                except Exception as e:
+                    logger.error(f"Worker {worker_id} failed on item: {str(e)}")
+                    result = None
+                processed += 1
+                if on_result:
+                    on_result(item, result)
+
+        workers = [asyncio.create_task(worker(i)) for i in range(self.max_workers)]
+        producer_task = asyncio.create_task(producer())
+        try:
+            await asyncio.gather(producer_task, *workers)
+        except BaseException:
+            for task in [producer_task, *workers]:
+                task.cancel()
+            await asyncio.gather(producer_task, *workers, return_exceptions=True)
+            raise
+
+        return processed
@@ -1,6 +1,7 @@
 import customtkinter as ctk
 from typing import Dict, Optional
 from .config import APIKeys
+from .config_store import get_config_store
 from .localization import Localization
 
 class APISettingsDialog:
@@ -81,7 +82,7 @@ class APISettingsDialog:
     
     def load_keys(self):
         """Загружает существующие ключи"""
-        api_keys = APIKeys.load()
+        api_keys = get_config_store().api_keys()
         if api_keys.openai:
             self.openai_key.insert(0, api_keys.openai)
         if api_keys.anthropic:
@@ -89,11 +90,12 @@ class APISettingsDialog:
     
     def save_and_close(self):
         """Сохраняет ключи и закрывает окно"""
-        api_keys = APIKeys(
+        store = get_config_store()
+        store.set_api_keys(APIKeys(
             openai=self.openai_key.get().strip() or None,
-            anthropic=self.anthropic_key.get().strip() or None
-        )
-        api_keys.save()
+            anthropic=self.anthropic_key.get().strip() or None,
+            google=store.api_keys().google
+        ))
         self.dialog.destroy()
     
     def change_language(self, choice):
@@ -0,0 +1,259 @@
+import asyncio
+import csv
+import hashlib
+import heapq
+import json
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from dataclasses import replace
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from .checkpoint import CheckpointStore
+from .config import Config
+from .dedup import normalize_item
+from .metrics import METRICS, configure_metrics
+from .readers import open_reader
+from .run_control import RunControl
+from .writers import open_writer, output_path
+
+logger = logging.getLogger(__name__)
+
+# Служебная колонка входа шарда: позиция строки в исходном файле
+SOURCE_ROW_COLUMN = "source_row"
+
+# Как часто пауза и отмена координатора передаются процессам шардов, секунды
+CONTROL_POLL_INTERVAL = 0.5
+
+
+def shard_of(value: Any, shards: int) -> int:
+    """Стабильный номер шарда: не зависит от процесса и PYTHONHASHSEED"""
+    digest = hashlib.sha1(str(value).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % shards
+
+
+def _watch_control(control: RunControl, paused, cancelled, done: threading.Event):
+    """Поток воркера: переносит паузу и отмену координатора в RunControl шарда"""
+    while not done.wait(CONTROL_POLL_INTERVAL):
+        if cancelled.is_set():
+            control.cancel()
+            return
+        if paused.is_set() != control.paused:
+            if paused.is_set():
+                control.pause()
+            else:
+                control.resume()
+
+
+def _run_shard(config: Config, resume: bool, share: float, paused=None, cancelled=None) -> bool:
+    """Точка входа процесса-воркера: свой цикл событий, пул контроллеров и клиенты моделей.
+
+    paused и cancelled - события multiprocessing.Manager, через которые
+    координатор ставит шард на паузу и отменяет его. Возвращает True, если
+    все строки шарда обработаны и его чекпоинт можно удалить после сборки.
+    """
+    from .data_processor import DataProcessor
+    from .rate_limiter import set_process_share
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format=f"%(asctime)s [{config.output_file.name}] %(name)s: %(message)s"
+    )
+    # Лимиты провайдера общие на все процессы, каждый шард получает свою долю
+    set_process_share(share)
+
+    control = RunControl()
+    # Процесс пула переиспользуется следующим шардом, поэтому поток наблюдения останавливается явно
+    done = threading.Event()
+    if cancelled is not None:
+        threading.Thread(target=_watch_control, args=(control, paused, cancelled, done), daemon=True).start()
+
+    async def run() -> bool:
+        processor = DataProcessor(config, resume=resume, control=control, keep_checkpoint=True)
+        try:
+            await processor.process_data()
+        finally:
+            await processor.cleanup()
+        return processor.completed
+
+    try:
+        return asyncio.run(run())
+    finally:
+        done.set()
+
+
+class ShardedRunner:
+    """Выполняет одно задание в нескольких процессах.
+
+    Вход делится по стабильному хешу ключевой колонки, так что дубликаты
+    попадают в один шард и дедупликация продолжает работать. Каждый шард
+    обрабатывается обычным DataProcessor в своем процессе, а координатор
+    собирает выходы шардов в исходном порядке строк.
+    """
+
+    def __init__(self, config: Config, resume: bool = True):
+        self.config = config
+        self.resume = resume
+        self.profile = config.profiles[config.profile_name]
+        self.shards = max(1, self.profile.shards)
+
+    def _shard_path(self, shard: int, suffix: str) -> Path:
+        output_file = self.config.output_file
+        return output_file.with_name(f"{output_file.name}.shard-{shard}{suffix}")
+
+    def _shard_key(self, item: Dict[str, Any]) -> Any:
+        """Значение для хеширования: нормализованная ключевая колонка или вся строка"""
+        column = self.profile.shard_column or self.profile.url_column
+        item = normalize_item(item, self.profile.normalize_rules)
+        value = item.get(column)
+        if value is None:
+            return json.dumps(item, sort_keys=True, ensure_ascii=False, default=str)
+        return value
+
+    def _split(self) -> List[Config]:
+        """Пишет вход каждого шарда и возвращает конфигурации воркеров.
+
+        Вход читается потоково и строки сразу дописываются в файл своего шарда.
+        """
+        reader = open_reader(self.config.input_file)
+        reader.validate(self.profile.input_columns)
+        fieldnames = reader.columns() + [SOURCE_ROW_COLUMN]
+
+        counts = [0] * self.shards
+        with ExitStack() as stack:
+            writers: Dict[int, csv.DictWriter] = {}
+            for idx, item in enumerate(reader.rows()):
+                shard = shard_of(self._shard_key(item), self.shards)
+                writer = writers.get(shard)
+                if writer is None:
+                    f = stack.enter_context(open(self._shard_path(shard, ".in.csv"), 'w', newline='', encoding='utf-8'))
+                    writer = writers[shard] = csv.DictWriter(f, fieldnames=fieldnames, extrasaction='ignore')
+                    writer.writeheader()
+                writer.writerow({**item, SOURCE_ROW_COLUMN: idx})
+                counts[shard] += 1
+
+        # Воркер не шардирует повторно; эндпоинт /metrics открывает только координатор.
+        # Бюджет делится между шардами так же, как лимиты провайдера
+        active = sum(1 for count in counts if count) or 1
+        budget = self.profile.max_cost_usd
+        profile = replace(
+            self.profile, shards=1, output_format=None, metrics_port=0,
+            max_cost_usd=budget / active if budget else budget
+        )
+        configs = []
+        for shard, count in enumerate(counts):
+            if not count:
+                continue
+            configs.append(replace(
+                self.config,
+                input_file=self._shard_path(shard, ".in.csv"),
+                output_file=self._shard_path(shard, ".jsonl"),
+                profiles={**self.config.profiles, self.config.profile_name: profile}
+            ))
+            logger.info(f"Shard {shard}: {count} rows")
+        return configs
+
+    @staticmethod
+    def _collect_metrics(config: Config):
+        """Переносит сводку метрик шарда в реестр координатора и удаляет ее файл"""
+        path = config.output_file.with_name(config.output_file.name + ".metrics.json")
+        if not path.exists():
+            return
+        with open(path, 'r', encoding='utf-8') as f:
+            METRICS.merge_summary(json.load(f))
+        path.unlink()
+
+    @staticmethod
+    def _shard_rows(path: Path) -> Iterator[Dict[str, Any]]:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    def _merge(self, configs: List[Config]):
+        """Собирает выходы шардов в исходном порядке строк.
+
+        Каждый шард уже упорядочен по source_row, поэтому выходы сливаются
+        потоково, без загрузки всех строк в память.
+        """
+        parts = [self._shard_rows(config.output_file) for config in configs if config.output_file.exists()]
+        rows = heapq.merge(*parts, key=lambda row: int(row[SOURCE_ROW_COLUMN]))
+        first = next(rows, None)
+        if first is None:
+            logger.warning("No results to save")
+            return
+        columns = [col for col in first if col != SOURCE_ROW_COLUMN]
+        path = output_path(self.config.output_file, self.profile.output_format)
+        with open_writer(path, columns) as writer:
+            writer.write(first)
+            for row in rows:
+                writer.write(row)
+        logger.info(f"Results of {len(parts)} shards saved to {path}")
+
+    async def run(self, max_processes: Optional[int] = None, control: Optional[RunControl] = None):
+        """Обрабатывает шарды и собирает итоговый файл.
+
+        Пауза и отмена control передаются всем запущенным шардам. После отмены
+        новые шарды не запускаются и выход не собирается: готовые строки
+        остаются в чекпоинтах шардов для resume.
+        """
+        control = control or RunControl()
+        configs = self._split()
+        # spawn: воркер не наследует цикл событий, браузеры и клиенты координатора
+        context = multiprocessing.get_context("spawn")
+        processes = min(max_processes or len(configs), len(configs)) or 1
+        loop = asyncio.get_running_loop()
+        configure_metrics(self.profile.metrics, self.profile.metrics_port)
+        # Шард передается пулу, только когда есть свободный процесс: отмена успевает его пропустить
+        slots = asyncio.Semaphore(processes)
+        completed: List[Config] = []
+
+        async def run_shard(config: Config):
+            async with slots:
+                if control.cancelled:
+                    return
+                if await loop.run_in_executor(
+                    executor, _run_shard, config, self.resume, 1 / processes, paused, cancelled
+                ):
+                    completed.append(config)
+            self._collect_metrics(config)
+
+        async def relay_control():
+            while True:
+                if control.cancelled:
+                    cancelled.set()
+                if control.paused:
+                    paused.set()
+                else:
+                    paused.clear()
+                await asyncio.sleep(CONTROL_POLL_INTERVAL)
+
+        try:
+            with context.Manager() as manager:
+                paused, cancelled = manager.Event(), manager.Event()
+                relay = asyncio.create_task(relay_control())
+                try:
+                    with ProcessPoolExecutor(max_workers=processes, mp_context=context) as executor:
+                        await asyncio.gather(*[run_shard(config) for config in configs])
+                finally:
+                    relay.cancel()
+
+            if control.cancelled:
+                logger.info("Sharded run cancelled, finished rows are kept in shard checkpoints for resume")
+            else:
+                self._merge(configs)
+                output_file = self.config.output_file
+                METRICS.write_summary(output_file.with_name(output_file.name + ".metrics.json"))
+                # Чекпоинты шардов с ошибками остаются для resume
+                for config in completed:
+                    CheckpointStore.for_output(config.output_file).remove()
+        finally:
+            METRICS.shutdown()
+        # Входы и выходы шардов больше не нужны: при resume они собираются заново из чекпоинтов
+        for config in configs:
+            for path in (config.input_file, config.output_file):
+                if path.exists():
+                    path.unlink()
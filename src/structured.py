@@ -0,0 +1,150 @@
+import json
+import re
+from typing import Any, Dict, List, Optional
+
+try:
+    import orjson
+
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+# Имя инструмента, через который модели без JSON режима возвращают строку
+RECORD_TOOL = "record_row"
+
+REPAIR_PROMPT = """The text below was supposed to be a single JSON object with the fields: {fields}.
+Rewrite it as that JSON object. Keep the values from the text, use null for missing fields.
+Answer with the JSON object only.
+
+TEXT:
+{text}"""
+
+_FENCE = re.compile(r"```(?:json|JSON)?\s*(.*?)(?:```|$)", re.DOTALL)
+
+
+def output_schema(columns: List[str]) -> Dict[str, Any]:
+    """JSON schema ответа строки по выходным колонкам профиля"""
+    return {
+        "type": "object",
+        "properties": {
+            column: {"type": ["string", "number", "boolean", "array", "null"]}
+            for column in columns
+        },
+        "required": list(columns)
+    }
+
+
+def structured_kwargs(provider: str, columns: List[str]) -> Dict[str, Any]:
+    """Параметры вызова, включающие нативный структурированный вывод провайдера.
+
+    OpenAI получает response_format с JSON schema, Anthropic - единственный
+    обязательный инструмент с той же схемой. Пустой словарь - режим недоступен.
+    """
+    schema = output_schema(columns)
+    if provider == "openai":
+        return {"response_format": {
+            "type": "json_schema",
+            "json_schema": {"name": "row", "schema": schema}
+        }}
+    if provider == "anthropic":
+        return {
+            "tools": [{
+                "name": RECORD_TOOL,
+                "description": "Record the answer for the row",
+                "input_schema": schema
+            }],
+            "tool_choice": {"type": "tool", "name": RECORD_TOOL}
+        }
+    return {}
+
+
+def generation_text(generation: Any) -> str:
+    """Текст ответа; для вызова инструмента - его аргументы в JSON"""
+    message = getattr(generation, "message", None)
+    tool_calls = getattr(message, "tool_calls", None)
+    if tool_calls:
+        return json.dumps(tool_calls[0].get("args", {}), ensure_ascii=False)
+    return generation.text
+
+
+def _balanced_end(text: str, start: int) -> Optional[int]:
+    """Позиция за закрывающей скобкой значения, начатого в start; None - значение оборвано"""
+    depth = 0
+    in_string = False
+    escaped = False
+    for pos in range(start, len(text)):
+        char = text[pos]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            depth += 1
+        elif char in "}]":
+            depth -= 1
+            if depth == 0:
+                return pos + 1
+    return None
+
+
+def _close_partial(fragment: str) -> str:
+    """Закрывает оборванные строку, массивы и объекты в конце ответа"""
+    stack = []
+    in_string = False
+    escaped = False
+    for char in fragment:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+        elif char in "}]" and stack:
+            stack.pop()
+    if in_string:
+        fragment += '"'
+    # Висящие запятая или ключ без значения не дают закрыть объект
+    fragment = re.sub(r'(,\s*|,?\s*"[^"]*"\s*:\s*)$', "", fragment)
+    return fragment + "".join(reversed(stack))
+
+
+def extract_json(text: str) -> Any:
+    """Достает JSON из ответа модели.
+
+    Понимает ответы в markdown блоках, с поясняющим текстом до или после
+    JSON и оборванные по лимиту токенов объекты. Бросает ValueError,
+    если JSON найти не удалось.
+    """
+    text = text.strip()
+    try:
+        return _loads(text)
+    except ValueError:
+        pass
+
+    fenced = _FENCE.search(text)
+    if fenced:
+        text = fenced.group(1).strip()
+    starts = [pos for pos in (text.find("{"), text.find("[")) if pos >= 0]
+    if not starts:
+        raise ValueError("No JSON value in the response")
+    start = min(starts)
+    end = _balanced_end(text, start)
+    candidate = text[start:end] if end else _close_partial(text[start:])
+    try:
+        return _loads(candidate)
+    except ValueError as e:
+        raise ValueError(f"Malformed JSON in the response: {e}")
+
+
+def repair_prompt(text: str, columns: List[str]) -> str:
+    return REPAIR_PROMPT.format(fields=", ".join(columns), text=text)
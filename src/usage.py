@@ -0,0 +1,155 @@
+import json
+import logging
+from contextlib import contextmanager
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, Iterator, Optional
+
+from .models import AVAILABLE_MODELS, estimate_cost
+from .rate_limiter import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Служебные колонки выходного файла с расходом строки
+PROMPT_TOKENS_COLUMN = "prompt_tokens"
+COMPLETION_TOKENS_COLUMN = "completion_tokens"
+COST_COLUMN = "cost_usd"
+USAGE_COLUMNS = [PROMPT_TOKENS_COLUMN, COMPLETION_TOKENS_COLUMN, COST_COLUMN]
+
+
+@dataclass
+class Usage:
+    """Токены и стоимость одного или нескольких вызовов модели"""
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost: float = 0.0
+
+    @property
+    def tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def __add__(self, other: "Usage") -> "Usage":
+        return Usage(
+            self.prompt_tokens + other.prompt_tokens,
+            self.completion_tokens + other.completion_tokens,
+            self.cost + other.cost
+        )
+
+    def share(self, parts: int) -> "Usage":
+        """Доля расхода пачки, приходящаяся на одну строку"""
+        parts = max(1, parts)
+        return Usage(self.prompt_tokens // parts, self.completion_tokens // parts, self.cost / parts)
+
+    def columns(self) -> Dict[str, Any]:
+        return {
+            PROMPT_TOKENS_COLUMN: self.prompt_tokens,
+            COMPLETION_TOKENS_COLUMN: self.completion_tokens,
+            COST_COLUMN: round(self.cost, 6)
+        }
+
+    @classmethod
+    def from_columns(cls, result: Dict[str, Any]) -> "Usage":
+        try:
+            return cls(
+                int(result.get(PROMPT_TOKENS_COLUMN) or 0),
+                int(result.get(COMPLETION_TOKENS_COLUMN) or 0),
+                float(result.get(COST_COLUMN) or 0.0)
+            )
+        except (TypeError, ValueError):
+            return cls()
+
+    @classmethod
+    def priced(cls, model_name: str, prompt_tokens: int, completion_tokens: int) -> "Usage":
+        return cls(prompt_tokens, completion_tokens, estimate_cost(model_name, prompt_tokens, completion_tokens))
+
+
+@lru_cache(maxsize=None)
+def _encoding(model: str):
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+def count_tokens(text: str, model: str = "gpt-4o-mini") -> int:
+    """Локальный подсчет токенов: tiktoken, если установлен, иначе оценка по длине"""
+    encoding = _encoding(model)
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def usage_from_response(response: Any) -> Optional[Dict[str, int]]:
+    """Токены из метаданных ответа провайдера (LLMResult LangChain) или None"""
+    try:
+        message = getattr(response.generations[0][0], "message", None)
+    except (AttributeError, IndexError):
+        message = None
+    metadata = getattr(message, "usage_metadata", None)
+    if metadata:
+        return {"prompt": metadata.get("input_tokens", 0), "completion": metadata.get("output_tokens", 0)}
+    llm_output = getattr(response, "llm_output", None) or {}
+    # OpenAI: token_usage, Anthropic: usage
+    usage = llm_output.get("token_usage") or llm_output.get("usage")
+    if usage:
+        return {
+            "prompt": usage.get("prompt_tokens", usage.get("input_tokens", 0)),
+            "completion": usage.get("completion_tokens", usage.get("output_tokens", 0))
+        }
+    return None
+
+
+def response_usage(model_name: str, response: Any, prompt: str, text: str) -> Usage:
+    """Расход вызова по метаданным провайдера, при их отсутствии - по локальному токенизатору"""
+    usage = usage_from_response(response)
+    if usage is None:
+        model = AVAILABLE_MODELS[model_name].params["model"]
+        usage = {"prompt": count_tokens(prompt, model), "completion": count_tokens(text, model)}
+    return Usage.priced(model_name, usage["prompt"], usage["completion"])
+
+
+class UsageTracker:
+    """Накопитель расхода всех вызовов модели внутри track_usage"""
+
+    def __init__(self, callback: Any = None):
+        self._callback = callback
+
+    def usage(self, model_name: str) -> Optional[Usage]:
+        """Расход по колбэку LangChain; None, если колбэк недоступен"""
+        if self._callback is None:
+            return None
+        prompt = completion = 0
+        for metadata in getattr(self._callback, "usage_metadata", {}).values():
+            prompt += metadata.get("input_tokens", 0)
+            completion += metadata.get("output_tokens", 0)
+        return Usage.priced(model_name, prompt, completion)
+
+
+@contextmanager
+def track_usage() -> Iterator[UsageTracker]:
+    """Считает токены всех вызовов модели в блоке, например шагов браузерного агента.
+
+    Колбэк LangChain хранится в contextvars, поэтому параллельные задачи
+    не смешивают свой расход.
+    """
+    try:
+        from langchain_core.callbacks import get_usage_metadata_callback
+    except ImportError:
+        yield UsageTracker()
+        return
+    with get_usage_metadata_callback() as callback:
+        yield UsageTracker(callback)
+
+
+def agent_usage(tracker: UsageTracker, model_name: str, prompt: str, answer: Any = None) -> Usage:
+    """Расход агента по колбэку, при его отсутствии - локальный подсчет задачи и ответа"""
+    usage = tracker.usage(model_name)
+    if usage is not None and usage.tokens:
+        return usage
+    model = AVAILABLE_MODELS[model_name].params["model"]
+    answer_text = json.dumps(answer, ensure_ascii=False, default=str) if answer else ""
+    return Usage.priced(model_name, count_tokens(prompt, model), count_tokens(answer_text, model))
@@ -0,0 +1,183 @@
+import csv
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from .usage import COMPLETION_TOKENS_COLUMN, COST_COLUMN, PROMPT_TOKENS_COLUMN
+
+# Строк в одной группе Parquet: память писателя ограничена группой
+PARQUET_ROW_GROUP = 5000
+
+# Колонки, которые в Parquet хранятся числами, остальные - строками
+INTEGER_COLUMNS = {PROMPT_TOKENS_COLUMN, COMPLETION_TOKENS_COLUMN}
+FLOAT_COLUMNS = {COST_COLUMN}
+
+
+def _text(value: Any) -> Optional[str]:
+    """Значение ячейки текстом: списки и словари из ответа модели - в JSON"""
+    if value is None:
+        return None
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False, default=str)
+    return str(value)
+
+
+class OutputWriter:
+    """Построчная запись результата; колонки фиксируются при создании.
+
+    Используется как контекстный менеджер: файл открывается на входе
+    и дописывается на выходе, строки не копятся в памяти целиком.
+    """
+
+    def __init__(self, path: Path, columns: List[str]):
+        self.path = Path(path)
+        self.columns = columns
+
+    def __enter__(self) -> "OutputWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def write(self, row: Dict[str, Any]):
+        raise NotImplementedError
+
+    def flush(self):
+        """Делает записанные строки видимыми в файле; xlsx и Parquet пишутся только при закрытии"""
+        pass
+
+    def close(self):
+        pass
+
+
+class CSVWriter(OutputWriter):
+    def __enter__(self) -> "CSVWriter":
+        self._file = open(self.path, 'w', newline='', encoding='utf-8')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(self.columns)
+        return self
+
+    def write(self, row: Dict[str, Any]):
+        self._writer.writerow([_text(row.get(col)) or "" for col in self.columns])
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class JSONLWriter(OutputWriter):
+    def __enter__(self) -> "JSONLWriter":
+        self._file = open(self.path, 'w', encoding='utf-8')
+        return self
+
+    def write(self, row: Dict[str, Any]):
+        record = {col: row.get(col) for col in self.columns}
+        self._file.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class XLSXWriter(OutputWriter):
+    """Потоковая запись xlsx через write-only режим openpyxl"""
+
+    def __enter__(self) -> "XLSXWriter":
+        from openpyxl import Workbook
+
+        self._workbook = Workbook(write_only=True)
+        self._sheet = self._workbook.create_sheet()
+        self._sheet.append(self.columns)
+        return self
+
+    def write(self, row: Dict[str, Any]):
+        values = []
+        for col in self.columns:
+            value = row.get(col)
+            values.append(value if isinstance(value, (int, float, bool)) else _text(value))
+        self._sheet.append(values)
+
+    def close(self):
+        self._workbook.save(self.path)
+
+
+class ParquetWriter(OutputWriter):
+    """Parquet группами строк через pyarrow.
+
+    Схема фиксирована заранее: расход - числа, остальные колонки - строки,
+    поэтому разнотипные ответы модели не ломают запись следующих групп.
+    """
+
+    def __enter__(self) -> "ParquetWriter":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self._pa = pa
+        self._schema = pa.schema([
+            (col, pa.int64() if col in INTEGER_COLUMNS else pa.float64() if col in FLOAT_COLUMNS else pa.string())
+            for col in self.columns
+        ])
+        self._writer = pq.ParquetWriter(self.path, self._schema)
+        self._buffer: Dict[str, List[Any]] = {col: [] for col in self.columns}
+        self._buffered = 0
+        return self
+
+    @staticmethod
+    def _number(value: Any, kind: type) -> Any:
+        try:
+            return None if value in (None, "") else kind(value)
+        except (TypeError, ValueError):
+            return None
+
+    def write(self, row: Dict[str, Any]):
+        for col in self.columns:
+            value = row.get(col)
+            if col in INTEGER_COLUMNS:
+                value = self._number(value, int)
+            elif col in FLOAT_COLUMNS:
+                value = self._number(value, float)
+            else:
+                value = _text(value)
+            self._buffer[col].append(value)
+        self._buffered += 1
+        if self._buffered >= PARQUET_ROW_GROUP:
+            self._flush()
+
+    def _flush(self):
+        if self._buffered:
+            self._writer.write_table(self._pa.Table.from_pydict(self._buffer, schema=self._schema))
+            self._buffer = {col: [] for col in self.columns}
+            self._buffered = 0
+
+    def close(self):
+        self._flush()
+        self._writer.close()
+
+
+WRITERS = {
+    "csv": CSVWriter,
+    "jsonl": JSONLWriter,
+    "xlsx": XLSXWriter,
+    "parquet": ParquetWriter
+}
+
+
+def output_path(path: Path, output_format: Optional[str] = None) -> Path:
+    """Путь итогового файла: формат профиля заменяет расширение выбранного файла"""
+    path = Path(path)
+    if output_format:
+        if output_format not in WRITERS:
+            raise ValueError(f"Unsupported output format: {output_format}")
+        return path.with_suffix(f".{output_format}")
+    return path
+
+
+def open_writer(path: Path, columns: List[str]) -> OutputWriter:
+    """Выбирает писателя по расширению файла; неизвестное расширение пишется как xlsx"""
+    path = Path(path)
+    writer = WRITERS.get(path.suffix.lower().lstrip("."), XLSXWriter)
+    return writer(path, columns)